@@ -0,0 +1,266 @@
+"""
+Glue Job: Manutenção de tabelas Delta Lake.
+
+Este job inspeciona a distribuição de tamanho dos arquivos de cada tabela
+Delta (staged e curated) a partir do log de transações e executa:
+- OPTIMIZE apenas quando a fragmentação passa do limite configurado
+  (Z-order nas colunas registradas pelo job raw→staged, quando houver);
+- VACUUM com retenção configurável;
+- checkpoint forçado do log.
+
+Ao final, reporta arquivos e bytes recuperados por tabela. Uma falha em
+uma tabela não interrompe a manutenção das demais; o job falha ao final
+listando as tabelas com erro.
+"""
+import sys
+
+from awsglue.utils import getResolvedOptions
+from delta.tables import DeltaTable
+from py4j.protocol import Py4JError
+from pyspark.sql import DataFrame, SparkSession
+from pyspark.sql.functions import col, count, sum as spark_sum, when
+
+STAGED_TABLES = ['movies', 'ratings', 'tags', 'links']
+CURATED_TABLES = [
+    'movie_ratings', 'movie_ratings_state', 'movie_genres',
+    'genre_year_ratings', 'user_tags', 'dq_metrics_history',
+    'dq_validation_results',
+]
+
+ZORDER_COLUMNS_PROPERTY = 'datahandson.zorderColumns'
+DEFAULT_RETENTION_HOURS = 168
+
+OPTIONAL_ARGS = {
+    'table_paths': '',
+    'small_file_threshold_mb': '32',
+    'fragmentation_threshold': '0.3',
+    'min_small_files': '10',
+    'vacuum_retention_hours': str(DEFAULT_RETENTION_HOURS),
+}
+
+
+def get_args():
+    """Obtém argumentos do Glue Job."""
+    args = getResolvedOptions(sys.argv, ['staged_bucket', 'curated_bucket'])
+    for name, default in OPTIONAL_ARGS.items():
+        if f'--{name}' in sys.argv:
+            args[name] = getResolvedOptions(sys.argv, [name])[name]
+        else:
+            args[name] = default
+    return args
+
+
+def init_spark():
+    """Inicializa SparkSession com configurações Delta Lake."""
+    return (
+        SparkSession.builder
+        .appName("DeltaTableMaintenance")
+        .config(
+            "spark.sql.extensions",
+            "io.delta.sql.DeltaSparkSessionExtension"
+        )
+        .config(
+            "spark.sql.catalog.spark_catalog",
+            "org.apache.spark.sql.delta.catalog.DeltaCatalog"
+        )
+        .getOrCreate()
+    )
+
+
+def get_table_paths(args):
+    """Retorna os caminhos das tabelas Delta a manter."""
+    if args["table_paths"]:
+        return [path.strip() for path in args["table_paths"].split(",")]
+
+    staged = [
+        f"s3://{args['staged_bucket']}/movielens_delta_glue/{table}/"
+        for table in STAGED_TABLES
+    ]
+    curated = [
+        f"s3://{args['curated_bucket']}/movielens_delta_glue/{table}/"
+        for table in CURATED_TABLES
+    ]
+    return staged + curated
+
+
+def get_delta_log(spark, table_path):
+    """Retorna o DeltaLog (JVM) da tabela."""
+    return spark._jvm.org.apache.spark.sql.delta.DeltaLog.forTable(
+        spark._jsparkSession, table_path
+    )
+
+
+def update_snapshot(spark, delta_log):
+    """Atualiza o DeltaLog e retorna o snapshot mais recente.
+
+    update() tem parâmetros default em Scala, que o Py4J não preenche; os
+    argumentos (stalenessAcceptable, checkIfUpdatedSinceTs,
+    catalogTableOpt) são passados explicitamente.
+    """
+    empty = spark._jvm.scala.Option.empty()
+    try:
+        return delta_log.update(False, empty, empty)
+    except Py4JError:
+        # Versões do Delta sem o parâmetro catalogTableOpt
+        return delta_log.update(False, empty)
+
+
+def get_file_stats(spark, table_path, small_file_bytes):
+    """Calcula a distribuição de tamanho dos arquivos ativos pelo log."""
+    snapshot = update_snapshot(spark, get_delta_log(spark, table_path))
+    files_df = DataFrame(snapshot.allFiles().toDF(), spark)
+
+    stats = files_df.agg(
+        count("*").alias("file_count"),
+        spark_sum("size").alias("total_bytes"),
+        count(when(col("size") < small_file_bytes, True)).alias(
+            "small_file_count"
+        ),
+    ).first()
+
+    file_count = stats["file_count"]
+    return {
+        "file_count": file_count,
+        "total_bytes": stats["total_bytes"] or 0,
+        "small_file_count": stats["small_file_count"],
+        "small_file_ratio": (
+            stats["small_file_count"] / file_count if file_count else 0.0
+        ),
+    }
+
+
+def get_storage_stats(spark, table_path):
+    """Retorna arquivos e bytes ocupados no storage pela tabela."""
+    hadoop_path = spark._jvm.org.apache.hadoop.fs.Path(table_path)
+    fs = hadoop_path.getFileSystem(spark._jsc.hadoopConfiguration())
+    summary = fs.getContentSummary(hadoop_path)
+    return {
+        "file_count": summary.getFileCount(),
+        "total_bytes": summary.getLength(),
+    }
+
+
+def needs_optimize(file_stats, fragmentation_threshold, min_small_files):
+    """Indica se a fragmentação da tabela justifica um OPTIMIZE."""
+    return (
+        file_stats["small_file_count"] >= min_small_files
+        and file_stats["small_file_ratio"] >= fragmentation_threshold
+    )
+
+
+def optimize_table(delta_table):
+    """Executa OPTIMIZE, com Z-order quando a tabela o tiver registrado."""
+    properties = delta_table.detail().first()["properties"] or {}
+    zorder_columns = properties.get(ZORDER_COLUMNS_PROPERTY)
+
+    if zorder_columns:
+        delta_table.optimize().executeZOrderBy(*zorder_columns.split(","))
+    else:
+        delta_table.optimize().executeCompaction()
+
+
+def vacuum_table(spark, delta_table, retention_hours):
+    """Executa VACUUM com a retenção configurada."""
+    if retention_hours < DEFAULT_RETENTION_HOURS:
+        spark.conf.set(
+            "spark.databricks.delta.retentionDurationCheck.enabled", "false"
+        )
+    delta_table.vacuum(retention_hours)
+
+
+def checkpoint_table(spark, table_path):
+    """Força a escrita de um checkpoint do log da tabela."""
+    delta_log = get_delta_log(spark, table_path)
+    snapshot = update_snapshot(spark, delta_log)
+    try:
+        delta_log.checkpoint(snapshot, spark._jvm.scala.Option.empty())
+    except Py4JError:
+        # Versões do Delta sem o parâmetro catalogTableOpt
+        delta_log.checkpoint(snapshot)
+
+
+def maintain_table(spark, table_path, args):
+    """Executa a manutenção de uma tabela e retorna o relatório."""
+    if not DeltaTable.isDeltaTable(spark, table_path):
+        print(f"Tabela Delta não encontrada, ignorando: {table_path}")
+        return None
+
+    small_file_bytes = int(args["small_file_threshold_mb"]) * 1024 * 1024
+    delta_table = DeltaTable.forPath(spark, table_path)
+
+    files_before = get_file_stats(spark, table_path, small_file_bytes)
+    storage_before = get_storage_stats(spark, table_path)
+
+    optimized = needs_optimize(
+        files_before,
+        float(args["fragmentation_threshold"]),
+        int(args["min_small_files"]),
+    )
+    if optimized:
+        optimize_table(delta_table)
+
+    vacuum_table(spark, delta_table, float(args["vacuum_retention_hours"]))
+    checkpoint_table(spark, table_path)
+
+    files_after = get_file_stats(spark, table_path, small_file_bytes)
+    storage_after = get_storage_stats(spark, table_path)
+
+    return {
+        "table_path": table_path,
+        "optimized": optimized,
+        "small_file_ratio": round(files_before["small_file_ratio"], 3),
+        "active_files_before": files_before["file_count"],
+        "active_files_after": files_after["file_count"],
+        "storage_files_reclaimed": (
+            storage_before["file_count"] - storage_after["file_count"]
+        ),
+        "storage_bytes_reclaimed": (
+            storage_before["total_bytes"] - storage_after["total_bytes"]
+        ),
+    }
+
+
+def print_report(reports):
+    """Imprime o relatório de manutenção por tabela."""
+    print("Relatório de manutenção:")
+    for report in reports:
+        print(f"  {report['table_path']}")
+        print(
+            f"    └─ OPTIMIZE: {'sim' if report['optimized'] else 'não'} "
+            f"(arquivos pequenos: {report['small_file_ratio']:.1%})"
+        )
+        print(
+            f"    └─ Arquivos ativos: {report['active_files_before']} → "
+            f"{report['active_files_after']}"
+        )
+        print(
+            f"    └─ Recuperado: {report['storage_files_reclaimed']} "
+            f"arquivos, {report['storage_bytes_reclaimed']:,} bytes"
+        )
+
+
+def main():
+    """Função principal do job."""
+    args = get_args()
+    spark = init_spark()
+
+    reports = []
+    failed = []
+    for table_path in get_table_paths(args):
+        try:
+            report = maintain_table(spark, table_path, args)
+        except Exception as e:
+            print(f"Falha na manutenção de {table_path}: {e}")
+            failed.append(table_path)
+            continue
+        if report:
+            reports.append(report)
+
+    print_report(reports)
+    if failed:
+        raise RuntimeError(f"Falha na manutenção das tabelas: {failed}")
+    print("Manutenção das tabelas Delta concluída com sucesso!")
+
+
+if __name__ == "__main__":
+    main()
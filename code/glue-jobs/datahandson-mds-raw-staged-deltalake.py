@@ -3,21 +3,188 @@ Glue Job: Raw to Staged Delta Lake.
 
 Este job lê dados Parquet do S3 Raw e escreve em formato Delta Lake
 no S3 Staged, realizando merge baseado em chave primária.
+
+Modos de ingestão (--ingestion_mode):
+- batch: lê todo o prefixo Parquet a cada execução (padrão).
+- stream: trata o prefixo como fonte de arquivos do Structured Streaming
+  com checkpoint e Trigger.availableNow, processando apenas os arquivos
+  que chegaram desde a última execução.
+
+Modos de merge (--merge_mode):
+- upsert: deduplica por chave primária e faz update/insert (padrão).
+- cdc: lê a coluna Op do DMS (I/U/D), mantém a última alteração por chave
+  ordenada por dms_timestamp_col e aplica deletes, updates e inserts.
+  Alterações da mesma transação têm o mesmo dms_timestamp_col; o empate é
+  desfeito pelo arquivo de origem e pela posição da linha no arquivo (o
+  DMS grava os arquivos CDC em ordem de commit).
+
+As tabelas staged carregam a coluna row_hash (hash do conteúdo da linha)
+e o merge só atualiza linhas cujo hash mudou, evitando reescrever
+arquivos quando o DMS reenvia dados idênticos.
+
+A condição de merge recebe o intervalo (min/max) das chaves do batch e as
+partições tocadas, permitindo ao Delta podar arquivos do alvo. O layout da
+tabela staged pode ser definido na criação (--table_layout):
+- none: sem organização física (padrão).
+- zorder: OPTIMIZE ZORDER BY pelas chaves primárias.
+- liquid: liquid clustering (CLUSTER BY) pelas chaves primárias.
+
+Com --table_manifest (lista JSON, ou caminho S3 de um arquivo JSON, de
+entradas com input_path, delta_table_path e primary_key) várias tabelas são
+processadas em uma única execução, em paralelo a partir da mesma
+SparkSession, cada uma em seu pool do FAIR scheduler.
+
+Tabelas registradas em TABLE_SCHEMAS têm suas colunas convertidas para os
+tipos declarados (int, float, timestamp a partir de epoch). Linhas com
+valores que não convertem são enviadas para a quarentena
+(--invalid_rows=quarantine, padrão) ou interrompem o job (fail). Tabelas
+staged criadas antes do schema tipado (colunas string) são reescritas uma
+única vez com os tipos declarados (overwriteSchema).
+
+O Change Data Feed é habilitado em todas as tabelas staged para que os
+jobs curated processem apenas as alterações desde a última execução.
 """
+import json
 import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
 
 from awsglue.utils import getResolvedOptions
 from delta.tables import DeltaTable
-from pyspark.sql import SparkSession
-from pyspark.sql.functions import col
+from pyspark.sql import SparkSession, Window
+from pyspark.sql.functions import (
+    col, concat_ws, current_timestamp, desc, expr, lit, row_number,
+    timestamp_seconds, trim, when, xxhash64,
+    max as spark_max, min as spark_min,
+)
+
+DMS_OP_COLUMN = 'Op'
+DMS_TIMESTAMP_COLUMN = 'dms_timestamp_col'
+ROW_HASH_COLUMN = 'row_hash'
+SOURCE_FILE_COLUMN = '_source_file'
+SOURCE_ROW_COLUMN = '_source_row'
+SOURCE_POSITION_COLUMNS = (SOURCE_FILE_COLUMN, SOURCE_ROW_COLUMN)
+HASH_EXCLUDED_COLUMNS = (DMS_OP_COLUMN, DMS_TIMESTAMP_COLUMN, ROW_HASH_COLUMN)
+ZORDER_COLUMNS_PROPERTY = 'datahandson.zorderColumns'
+CHANGE_DATA_FEED_PROPERTY = 'delta.enableChangeDataFeed'
+MAX_PRUNED_PARTITIONS = 1000
+CAST_ERRORS_COLUMN = '_cast_errors'
+
+# Tipos das colunas staged por tabela. "epoch_timestamp" converte segundos
+# desde epoch em timestamp.
+TABLE_SCHEMAS = {
+    'movies': {
+        'movieid': 'int',
+        'title': 'string',
+        'genres': 'string',
+    },
+    'ratings': {
+        'userid': 'int',
+        'movieid': 'int',
+        'rating': 'float',
+        'timestamp': 'epoch_timestamp',
+    },
+    'tags': {
+        'userid': 'int',
+        'movieid': 'int',
+        'tag': 'string',
+        'timestamp': 'epoch_timestamp',
+    },
+    'links': {
+        'movieid': 'int',
+        'imdbid': 'string',  # Mantém zeros à esquerda do IMDb
+        'tmdbid': 'int',
+    },
+}
+
+
+TABLE_ARGS = ['input_path', 'delta_table_path', 'primary_key']
+
+OPTIONAL_ARGS = {
+    'ingestion_mode': 'batch',
+    'checkpoint_path': '',
+    'merge_mode': 'upsert',
+    'table_layout': 'none',
+    'table_manifest': '',
+    'max_parallel_tables': '4',
+    'invalid_rows': 'quarantine',
+    'quarantine_path': '',
+}
 
 
 def get_args():
     """Obtém argumentos do Glue Job."""
-    return getResolvedOptions(
-        sys.argv,
-        ['input_path', 'delta_table_path', 'primary_key']
-    )
+    required_args = [] if '--table_manifest' in sys.argv else TABLE_ARGS
+    args = getResolvedOptions(sys.argv, required_args) if required_args else {}
+    for name, default in OPTIONAL_ARGS.items():
+        if f'--{name}' in sys.argv:
+            args[name] = getResolvedOptions(sys.argv, [name])[name]
+        else:
+            args[name] = default
+    return args
+
+
+def load_table_manifest(spark, table_manifest):
+    """Carrega o manifesto de tabelas (JSON inline ou arquivo no S3)."""
+    if table_manifest.startswith("s3://"):
+        table_manifest = spark.sparkContext.wholeTextFiles(
+            table_manifest
+        ).first()[1]
+    return json.loads(table_manifest)
+
+
+def get_table_configs(spark, args):
+    """Monta a configuração de cada tabela a partir dos argumentos.
+
+    Com --table_manifest, --checkpoint_path e --quarantine_path são bases:
+    cada tabela usa <base>/<tabela>/, para que os streams em paralelo não
+    compartilhem checkpoint nem quarentena.
+    """
+    defaults = {
+        name: args[name]
+        for name in ('ingestion_mode', 'checkpoint_path', 'merge_mode',
+                     'table_layout', 'invalid_rows', 'quarantine_path')
+    }
+    if args["table_manifest"]:
+        entries = load_table_manifest(spark, args["table_manifest"])
+    else:
+        entries = [{name: args[name] for name in TABLE_ARGS}]
+
+    table_configs = []
+    for entry in entries:
+        delta_table_path = entry["delta_table_path"].rstrip('/')
+        name = entry.get("name", delta_table_path.rsplit('/', 1)[1])
+        table_defaults = dict(defaults)
+        if args["table_manifest"]:
+            for path_arg in ('checkpoint_path', 'quarantine_path'):
+                if defaults[path_arg]:
+                    table_defaults[path_arg] = (
+                        f"{defaults[path_arg].rstrip('/')}/{name}/"
+                    )
+        table_configs.append({**table_defaults, **entry, "name": name})
+    return table_configs
+
+
+def get_table_side_path(delta_table_path, folder):
+    """Retorna caminho auxiliar da tabela (ex.: _checkpoints/<tabela>/)."""
+    base_path, table_name = delta_table_path.rstrip('/').rsplit('/', 1)
+    return f"{base_path}/{folder}/{table_name}/"
+
+
+def get_checkpoint_path(delta_table_path, checkpoint_path=''):
+    """Retorna o caminho de checkpoint do streaming da tabela."""
+    if checkpoint_path:
+        return checkpoint_path
+    return get_table_side_path(delta_table_path, "_checkpoints")
+
+
+def get_quarantine_path(delta_table_path, quarantine_path=''):
+    """Retorna o caminho da quarentena de linhas inválidas da tabela."""
+    if quarantine_path:
+        return quarantine_path
+    return get_table_side_path(delta_table_path, "_quarantine")
 
 
 def init_spark():
@@ -25,19 +192,186 @@ def init_spark():
     return (
         SparkSession.builder
         .appName("Glue Delta Merge")
+        .config("spark.scheduler.mode", "FAIR")
         .getOrCreate()
     )
 
 
+def add_source_position(input_df):
+    """Adiciona o arquivo de origem e a posição da linha no arquivo."""
+    return input_df.select(
+        "*",
+        col("_metadata.file_path").alias(SOURCE_FILE_COLUMN),
+        col("_metadata.row_index").alias(SOURCE_ROW_COLUMN),
+    )
+
+
+def drop_source_position(input_df):
+    """Remove as colunas de posição na origem."""
+    return input_df.drop(*SOURCE_POSITION_COLUMNS)
+
+
 def read_input_data(spark, input_path):
     """Lê dados Parquet do caminho de entrada."""
-    return spark.read.parquet(input_path)
+    return add_source_position(spark.read.parquet(input_path))
+
+
+def read_input_stream(spark, input_path):
+    """Lê o prefixo Parquet como fonte de arquivos do Structured Streaming."""
+    schema = spark.read.parquet(input_path).schema
+    return add_source_position(
+        spark.readStream.schema(schema).parquet(input_path)
+    )
+
+
+def build_cast_expression(column, data_type):
+    """Gera expressão de conversão da coluna para o tipo declarado."""
+    if data_type == "epoch_timestamp":
+        return timestamp_seconds(col(column).cast("long"))
+    return col(column).cast(data_type)
 
 
-def initialize_delta_table(spark, delta_table_path, input_df):
+def check_table_schema(input_df, table_schema):
+    """Marca em _cast_errors as colunas cujo valor não converte."""
+    columns_by_name = {c.lower(): c for c in input_df.columns}
+    errors = []
+    for name, data_type in table_schema.items():
+        column = columns_by_name.get(name)
+        if column is None or data_type == "string":
+            continue
+        failed = (
+            col(column).isNotNull()
+            & (trim(col(column).cast("string")) != "")
+            & build_cast_expression(column, data_type).isNull()
+        )
+        errors.append(when(failed, lit(column)))
+    return input_df.withColumn(CAST_ERRORS_COLUMN, concat_ws(",", *errors))
+
+
+def cast_table_schema(checked_df, table_schema):
+    """Converte as colunas válidas para os tipos declarados."""
+    return checked_df.select(*[
+        build_cast_expression(c, table_schema[c.lower()]).alias(c)
+        if c.lower() in table_schema else col(c)
+        for c in checked_df.columns if c != CAST_ERRORS_COLUMN
+    ])
+
+
+def quarantine_invalid_rows(invalid_df, quarantine_path):
+    """Grava linhas que falharam na conversão de tipos na quarentena."""
+    (
+        invalid_df
+        .withColumn("_quarantined_at", current_timestamp())
+        .write.format("delta")
+        .mode("append")
+        .option("mergeSchema", "true")
+        .save(quarantine_path)
+    )
+
+
+def apply_table_schema(input_df, table_config):
+    """Aplica o schema registrado da tabela e trata linhas inválidas."""
+    table_schema = TABLE_SCHEMAS.get(table_config["name"])
+    if table_schema is None:
+        return input_df
+
+    checked_df = check_table_schema(input_df, table_schema)
+    invalid_df = checked_df.filter(col(CAST_ERRORS_COLUMN) != "")
+    invalid_count = invalid_df.count()
+
+    if invalid_count:
+        if table_config["invalid_rows"] == "fail":
+            raise ValueError(
+                f"{invalid_count} linhas de {table_config['name']} "
+                f"falharam na conversão de tipos"
+            )
+        quarantine_path = get_quarantine_path(
+            table_config["delta_table_path"], table_config["quarantine_path"]
+        )
+        quarantine_invalid_rows(invalid_df, quarantine_path)
+        print(
+            f"{invalid_count} linhas de {table_config['name']} "
+            f"enviadas para a quarentena: {quarantine_path}"
+        )
+
+    valid_df = checked_df.filter(col(CAST_ERRORS_COLUMN) == "")
+    return cast_table_schema(valid_df, table_schema)
+
+
+def get_type_drift(delta_table, table_schema):
+    """Retorna as colunas da tabela cujo tipo difere do schema registrado."""
+    drift = []
+    for field in delta_table.toDF().schema.fields:
+        data_type = table_schema.get(field.name.lower())
+        if data_type is None:
+            continue
+        expected = "timestamp" if data_type == "epoch_timestamp" else data_type
+        if field.dataType.simpleString() != expected:
+            drift.append(field.name)
+    return drift
+
+
+def migrate_table_schema(spark, table_config):
+    """Reescreve uma vez a tabela staged com os tipos registrados.
+
+    Linhas existentes que não convertem seguem a regra de --invalid_rows.
+    """
+    table_schema = TABLE_SCHEMAS.get(table_config["name"])
+    delta_table_path = table_config["delta_table_path"]
+    if table_schema is None or not DeltaTable.isDeltaTable(
+        spark, delta_table_path
+    ):
+        return
+
+    delta_table = DeltaTable.forPath(spark, delta_table_path)
+    drift = get_type_drift(delta_table, table_schema)
+    if not drift:
+        return
+
+    print(
+        f"Reescrevendo {table_config['name']} com o schema tipado "
+        f"(colunas: {', '.join(drift)})"
+    )
+    partition_columns = delta_table.detail().first()["partitionColumns"]
+    typed_df = add_row_hash(
+        apply_table_schema(delta_table.toDF(), table_config)
+    )
+    writer = (
+        typed_df.write.format("delta")
+        .mode("overwrite")
+        .option("overwriteSchema", "true")
+    )
+    if partition_columns:
+        writer = writer.partitionBy(*partition_columns)
+    writer.save(delta_table_path)
+
+
+def initialize_delta_table(spark, delta_table_path, input_df,
+                           primary_keys=None, table_layout='none'):
     """Inicializa tabela Delta se não existir."""
+    if table_layout == "liquid" and primary_keys:
+        view_name = f"staged_initial_load_{uuid.uuid4().hex}"
+        input_df.createOrReplaceTempView(view_name)
+        spark.sql(
+            f"CREATE TABLE delta.`{delta_table_path}` USING DELTA "
+            f"CLUSTER BY ({', '.join(primary_keys)}) "
+            f"TBLPROPERTIES ('{CHANGE_DATA_FEED_PROPERTY}' = 'true') "
+            f"AS SELECT * FROM {view_name}"
+        )
+        spark.catalog.dropTempView(view_name)
+        return DeltaTable.forPath(spark, delta_table_path)
+
     input_df.write.format("delta").mode("overwrite").save(delta_table_path)
-    return DeltaTable.forPath(spark, delta_table_path)
+    delta_table = DeltaTable.forPath(spark, delta_table_path)
+    ensure_change_data_feed(spark, delta_table, delta_table_path)
+
+    if table_layout == "zorder" and primary_keys:
+        delta_table.optimize().executeZOrderBy(*primary_keys)
+        spark.sql(
+            f"ALTER TABLE delta.`{delta_table_path}` SET TBLPROPERTIES "
+            f"('{ZORDER_COLUMNS_PROPERTY}' = '{','.join(primary_keys)}')"
+        )
+    return delta_table
 
 
 def get_merge_condition(primary_keys):
@@ -47,35 +381,297 @@ def get_merge_condition(primary_keys):
     )
 
 
-def perform_merge(spark, input_df, delta_table_path, primary_keys):
+def get_key_bounds_condition(input_df, primary_keys):
+    """Gera predicado com o intervalo das chaves do batch no alvo."""
+    bounds = input_df.agg(
+        *[spark_min(key).alias(f"min_{key}") for key in primary_keys],
+        *[spark_max(key).alias(f"max_{key}") for key in primary_keys],
+    ).first()
+
+    return [
+        col(f"target.{key}").between(
+            lit(bounds[f"min_{key}"]), lit(bounds[f"max_{key}"])
+        )
+        for key in primary_keys
+        if bounds[f"min_{key}"] is not None
+    ]
+
+
+def get_partitions_condition(delta_table, input_df, primary_keys):
+    """Gera predicado com as partições do alvo tocadas pelo batch.
+
+    Só vale para colunas de partição que fazem parte da chave primária: se
+    a partição de uma chave pudesse mudar, a linha antiga no alvo não seria
+    encontrada e a chave seria inserida em duplicidade.
+    """
+    partition_columns = delta_table.detail().first()["partitionColumns"]
+    conditions = []
+
+    for column in partition_columns:
+        if column not in primary_keys or column not in input_df.columns:
+            continue
+        values = [
+            row[column]
+            for row in input_df.select(column).distinct()
+            .limit(MAX_PRUNED_PARTITIONS + 1).collect()
+        ]
+        if len(values) > MAX_PRUNED_PARTITIONS:
+            continue
+        conditions.append(col(f"target.{column}").isin(values))
+    return conditions
+
+
+def get_pruned_merge_condition(delta_table, input_df, primary_keys):
+    """Gera condição de merge com poda por intervalo de chaves e partições."""
+    conditions = [expr(get_merge_condition(primary_keys))]
+    conditions += get_key_bounds_condition(input_df, primary_keys)
+    conditions += get_partitions_condition(
+        delta_table, input_df, primary_keys
+    )
+    return reduce(lambda left, right: left & right, conditions)
+
+
+def get_row_changed_condition():
+    """Gera condição que só é verdadeira quando o conteúdo da linha mudou."""
+    return f"NOT (target.{ROW_HASH_COLUMN} <=> source.{ROW_HASH_COLUMN})"
+
+
+def add_row_hash(input_df):
+    """Adiciona coluna com hash do conteúdo da linha (sem colunas do DMS)."""
+    hash_columns = [
+        c for c in input_df.columns if c not in HASH_EXCLUDED_COLUMNS
+    ]
+    return input_df.withColumn(ROW_HASH_COLUMN, xxhash64(*hash_columns))
+
+
+def ensure_row_hash_column(spark, delta_table, delta_table_path):
+    """Adiciona row_hash em tabelas staged criadas antes da coluna existir."""
+    if ROW_HASH_COLUMN in delta_table.toDF().columns:
+        return
+    spark.sql(
+        f"ALTER TABLE delta.`{delta_table_path}` "
+        f"ADD COLUMNS ({ROW_HASH_COLUMN} BIGINT)"
+    )
+
+
+def ensure_change_data_feed(spark, delta_table, delta_table_path):
+    """Habilita o Change Data Feed na tabela staged, se necessário."""
+    properties = delta_table.detail().first()["properties"] or {}
+    if properties.get(CHANGE_DATA_FEED_PROPERTY) == "true":
+        return
+    spark.sql(
+        f"ALTER TABLE delta.`{delta_table_path}` SET TBLPROPERTIES "
+        f"('{CHANGE_DATA_FEED_PROPERTY}' = 'true')"
+    )
+
+
+def get_latest_changes(input_df, primary_keys):
+    """Mantém apenas a última alteração CDC do DMS por chave primária."""
+    if DMS_OP_COLUMN not in input_df.columns:
+        # Arquivos de full-load não trazem a coluna Op
+        input_df = input_df.withColumn(DMS_OP_COLUMN, lit("I"))
+
+    # Desempate determinístico entre alterações da mesma transação
+    window = Window.partitionBy(*primary_keys).orderBy(
+        desc(DMS_TIMESTAMP_COLUMN),
+        desc(SOURCE_FILE_COLUMN),
+        desc(SOURCE_ROW_COLUMN),
+    )
+    return drop_source_position(
+        input_df
+        .withColumn("_row_number", row_number().over(window))
+        .filter(col("_row_number") == 1)
+        .drop("_row_number")
+    )
+
+
+def perform_cdc_merge(spark, input_df, delta_table_path, primary_keys,
+                      table_layout='none'):
+    """Aplica alterações CDC do DMS (I/U/D) na tabela Delta."""
+    changes_df = add_row_hash(get_latest_changes(input_df, primary_keys))
+    data_columns = [c for c in changes_df.columns if c != DMS_OP_COLUMN]
+
+    if not DeltaTable.isDeltaTable(spark, delta_table_path):
+        initial_df = (
+            changes_df
+            .filter(col(DMS_OP_COLUMN) != "D")
+            .select(*data_columns)
+        )
+        return initialize_delta_table(
+            spark, delta_table_path, initial_df, primary_keys, table_layout
+        )
+
+    delta_table = DeltaTable.forPath(spark, delta_table_path)
+    ensure_row_hash_column(spark, delta_table, delta_table_path)
+    ensure_change_data_feed(spark, delta_table, delta_table_path)
+    changes_df = changes_df.persist()
+    merge_condition = get_pruned_merge_condition(
+        delta_table, changes_df, primary_keys
+    )
+    source_values = {c: col(f"source.{c}") for c in data_columns}
+
+    (
+        delta_table.alias("target")
+        .merge(changes_df.alias("source"), merge_condition)
+        .whenMatchedDelete(condition=f"source.{DMS_OP_COLUMN} = 'D'")
+        .whenMatchedUpdate(
+            condition=(
+                f"source.{DMS_OP_COLUMN} != 'D' AND "
+                f"{get_row_changed_condition()}"
+            ),
+            set=source_values
+        )
+        .whenNotMatchedInsert(
+            condition=f"source.{DMS_OP_COLUMN} != 'D'",
+            values=source_values
+        )
+        .execute()
+    )
+    changes_df.unpersist()
+
+
+def perform_merge(spark, input_df, delta_table_path, primary_keys,
+                  merge_mode='upsert', table_layout='none'):
     """Executa merge dos dados na tabela Delta."""
+    if merge_mode == "cdc":
+        return perform_cdc_merge(
+            spark, input_df, delta_table_path, primary_keys, table_layout
+        )
+
+    input_df = add_row_hash(
+        drop_source_position(input_df.dropDuplicates(primary_keys))
+    )
+
     if not DeltaTable.isDeltaTable(spark, delta_table_path):
-        return initialize_delta_table(spark, delta_table_path, input_df)
+        return initialize_delta_table(
+            spark, delta_table_path, input_df, primary_keys, table_layout
+        )
 
     delta_table = DeltaTable.forPath(spark, delta_table_path)
-    input_df = input_df.dropDuplicates(primary_keys)
-    merge_condition = get_merge_condition(primary_keys)
+    ensure_row_hash_column(spark, delta_table, delta_table_path)
+    ensure_change_data_feed(spark, delta_table, delta_table_path)
+    input_df = input_df.persist()
+    merge_condition = get_pruned_merge_condition(
+        delta_table, input_df, primary_keys
+    )
 
     (
         delta_table.alias("target")
         .merge(input_df.alias("source"), merge_condition)
         .whenMatchedUpdate(
+            condition=get_row_changed_condition(),
             set={c: col(f"source.{c}") for c in input_df.columns}
         )
         .whenNotMatchedInsertAll()
         .execute()
     )
+    input_df.unpersist()
+
+
+def run_incremental_merge(spark, input_path, checkpoint_path, merge_df):
+    """Executa merge apenas dos arquivos novos via Trigger.availableNow."""
+    stream_df = read_input_stream(spark, input_path)
+
+    def merge_batch(batch_df, batch_id):
+        print(f"Processando micro-batch {batch_id} de {input_path}")
+        merge_df(batch_df)
+
+    query = (
+        stream_df.writeStream
+        .foreachBatch(merge_batch)
+        .option("checkpointLocation", checkpoint_path)
+        .trigger(availableNow=True)
+        .start()
+    )
+    query.awaitTermination()
+
+
+def process_table(spark, table_config):
+    """Executa a ingestão raw→staged de uma tabela."""
+    primary_keys = [
+        key.strip() for key in table_config["primary_key"].split(",")
+    ]
+
+    def merge_df(input_df):
+        input_df = input_df.persist()
+        typed_df = apply_table_schema(input_df, table_config)
+        perform_merge(
+            spark, typed_df, table_config["delta_table_path"], primary_keys,
+            table_config["merge_mode"], table_config["table_layout"]
+        )
+        input_df.unpersist()
+
+    migrate_table_schema(spark, table_config)
+
+    if table_config["ingestion_mode"] == "stream":
+        checkpoint_path = get_checkpoint_path(
+            table_config["delta_table_path"], table_config["checkpoint_path"]
+        )
+        run_incremental_merge(
+            spark, table_config["input_path"], checkpoint_path, merge_df
+        )
+    else:
+        merge_df(read_input_data(spark, table_config["input_path"]))
+
+
+def run_table(spark, table_config):
+    """Processa uma tabela em seu pool do FAIR scheduler e retorna o status."""
+    spark.sparkContext.setLocalProperty(
+        "spark.scheduler.pool", f"raw_staged_{table_config['name']}"
+    )
+    start = time.time()
+    try:
+        process_table(spark, table_config)
+        status, error = "SUCCEEDED", None
+    except Exception as e:
+        status, error = "FAILED", str(e)
+    finally:
+        spark.sparkContext.setLocalProperty("spark.scheduler.pool", None)
+
+    return {
+        "table": table_config["name"],
+        "status": status,
+        "duration_seconds": round(time.time() - start, 1),
+        "error": error,
+    }
+
+
+def run_tables(spark, table_configs, max_parallel_tables):
+    """Processa as tabelas em paralelo com um pool de threads limitado."""
+    max_workers = max(1, min(max_parallel_tables, len(table_configs)))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(
+            lambda table_config: run_table(spark, table_config),
+            table_configs
+        ))
+
+
+def print_report(results):
+    """Imprime o status de cada tabela processada."""
+    print("Resultado por tabela:")
+    for result in results:
+        print(
+            f"  {result['table']}: {result['status']} "
+            f"({result['duration_seconds']}s)"
+        )
+        if result["error"]:
+            print(f"    └─ {result['error']}")
 
 
 def main():
     """Função principal do job."""
     args = get_args()
     spark = init_spark()
-    input_df = read_input_data(spark, args["input_path"])
 
-    primary_keys = [key.strip() for key in args["primary_key"].split(",")]
+    table_configs = get_table_configs(spark, args)
+    results = run_tables(
+        spark, table_configs, int(args["max_parallel_tables"])
+    )
+    print_report(results)
 
-    perform_merge(spark, input_df, args["delta_table_path"], primary_keys)
+    failed = [r["table"] for r in results if r["status"] != "SUCCEEDED"]
+    if failed:
+        raise RuntimeError(f"Falha na ingestão das tabelas: {failed}")
     print("Processo concluído com sucesso!")
 
 
@@ -0,0 +1,1151 @@
+"""
+Glue Job: Staged to Curated.
+
+Este job lê as tabelas Delta Lake do S3 Staged uma única vez e calcula
+todas as tabelas curated registradas em CURATED_TABLES na mesma aplicação
+Spark. Tabelas staged usadas por mais de uma saída ficam em cache.
+
+Para adicionar uma tabela curated basta registrar em CURATED_TABLES:
+- 'transform': função que recebe os DataFrames staged de 'sources' e
+  retorna o DataFrame final (a tabela é sobrescrita a cada execução); ou
+- 'refresh': função que recebe o contexto do job e atualiza a tabela
+  (usada pelas tabelas com atualização incremental).
+Opcionalmente, 'partition' define a coluna de bucket e a chave de origem
+e 'suite' a suite de Data Quality usada na auditoria antes do commit.
+
+Modos de atualização (--refresh_mode):
+- incremental: tabelas com 'refresh' leem o Change Data Feed das tabelas
+  staged desde a última versão processada (padrão).
+- full: recalcula todas as tabelas.
+
+As versões processadas ficam no userMetadata dos commits curated. As
+tabelas curated também têm Change Data Feed habilitado, usado pela
+validação incremental do job de Data Quality.
+
+movie_ratings é calculada em uma única agregação sobre ratings com
+contagem, soma, soma dos quadrados (desvio padrão), média bayesiana,
+usuários distintos (sketch HLL) e mediana/p90 (histograma de ratings).
+O estado mergeável fica em movie_ratings_state, de modo que execuções
+incrementais combinam deltas em vez de reler ratings.
+
+Write-audit-publish: antes de cada commit, o DataFrame a publicar é
+validado pela suite de Data Quality da tabela ('suite' no registro), com o
+mesmo motor e o mesmo JSON de resultado do job de Data Quality. Se a
+validação falha, o commit é bloqueado e a tabela é marcada como FAILED.
+Nas atualizações incrementais, são auditadas as linhas alteradas. Com
+--datadocs_bucket, os resultados são gravados junto aos do job de Data
+Quality e as reescritas completas alimentam seu cache, dispensando a
+releitura da tabela.
+
+Com --partition_buckets > 0, as tabelas curated com 'partition' no registro
+são particionadas por um bucket de hash da chave (ex.: movieid_bucket). Nas
+reescritas completas, apenas as partições cujo conteúdo mudou são
+substituídas (replaceWhere), comparando contagem e hash por partição.
+
+A partir de movies também são gerados a tabela ponte movie_genres, a
+máscara de bits genre_mask em movie_ratings e o rollup genre_year_ratings
+(gênero × ano de lançamento extraído do título), calculado sobre o estado
+mergeável de movie_ratings_state na versão usada pela última publicação
+aprovada de movie_ratings.
+"""
+import json
+import sys
+import time
+from collections import Counter
+from functools import reduce
+
+from awsglue.utils import getResolvedOptions
+from datahandson_mds_dq_engine import (
+    DEFAULT_OPTIONS, SUITE_NAME_MOVIES, SUITE_NAME_TAGS, SUITES,
+    get_change_sign, get_run_id, get_suite_hash, get_table_version,
+    is_missing_file_error, print_failed_expectations, save_cache_entry,
+    save_validation_result, validate_dataframe,
+)
+from delta.tables import DeltaTable
+from py4j.protocol import Py4JJavaError
+from pyspark.sql import SparkSession
+from pyspark.sql.functions import (
+    array, array_contains, coalesce, col, count, desc, explode, expr, greatest,
+    hll_sketch_agg, hll_sketch_estimate, hll_union_agg, least, lit, pmod,
+    regexp_extract, split, sqrt, when, xxhash64,
+)
+from pyspark.sql.functions import round as spark_round
+from pyspark.sql.functions import sum as spark_sum
+from pyspark.sql.utils import AnalysisException
+
+USER_METADATA_CONF = 'spark.databricks.delta.commitInfo.userMetadata'
+CHANGE_DATA_FEED_PROPERTY = 'delta.enableChangeDataFeed'
+RETENTION_PROPERTY = 'delta.deletedFileRetentionDuration'
+DEFAULT_RETENTION = 'interval 1 week'
+# Falhas de leitura do Change Data Feed: AnalysisException ao montar o plano
+# e Py4JJavaError na primeira ação (filtrado por fall_back_from_change_feed)
+CHANGE_FEED_ERRORS = (AnalysisException, Py4JJavaError)
+
+# Ratings do MovieLens vão de 0.5 a 5.0 em passos de 0.5: o histograma
+# por passo é um sketch de quantis exato e mergeável (inclusive deletes).
+RATING_BUCKETS = 10
+HLL_LG_CONFIG_K = 12
+GENRES = [
+    'Action', 'Adventure', 'Animation', 'Children', 'Comedy', 'Crime',
+    'Documentary', 'Drama', 'Fantasy', 'Film-Noir', 'Horror', 'IMAX',
+    'Musical', 'Mystery', 'Romance', 'Sci-Fi', 'Thriller', 'War', 'Western',
+]
+NO_GENRES_LISTED = '(no genres listed)'
+RATINGS_STATE_COLUMNS = [
+    'movieid', 'rating_count', 'rating_sum', 'rating_sum_sq',
+    'rating_histogram', 'users_sketch',
+]
+
+OPTIONAL_ARGS = {
+    'refresh_mode': 'incremental',
+    'tables': '',
+    'bayesian_prior_weight': '10',
+    'partition_buckets': '0',
+    'audit': 'true',
+    'datadocs_bucket': '',
+}
+
+
+def get_args():
+    """Obtém argumentos do Glue Job."""
+    args = getResolvedOptions(sys.argv, ['staged_bucket', 'curated_bucket'])
+    for name, default in OPTIONAL_ARGS.items():
+        if f'--{name}' in sys.argv:
+            args[name] = getResolvedOptions(sys.argv, [name])[name]
+        else:
+            args[name] = default
+    return args
+
+
+def init_spark():
+    """Inicializa SparkSession com configurações Delta Lake."""
+    return (
+        SparkSession.builder
+        .appName("CuratedLayer")
+        .config(
+            "spark.sql.extensions",
+            "io.delta.sql.DeltaSparkSessionExtension"
+        )
+        .config(
+            "spark.sql.catalog.spark_catalog",
+            "org.apache.spark.sql.delta.catalog.DeltaCatalog"
+        )
+        .enableHiveSupport()
+        .getOrCreate()
+    )
+
+
+###############################################################################
+# Leitura das tabelas staged e metadados Delta
+###############################################################################
+def create_context(spark, args, curated_tables):
+    """Cria o contexto compartilhado entre as tabelas curated."""
+    source_usage = Counter(
+        source
+        for table in curated_tables
+        for source in CURATED_TABLES[table]["sources"]
+    )
+    return {
+        "spark": spark,
+        "staged_base": f"s3://{args['staged_bucket']}/movielens_delta_glue",
+        "curated_base": f"s3://{args['curated_bucket']}/movielens_delta_glue",
+        "refresh_mode": args["refresh_mode"],
+        "bayesian_prior_weight": float(args["bayesian_prior_weight"]),
+        "partition_buckets": int(args["partition_buckets"]),
+        "audit": args["audit"].lower() == "true",
+        "datadocs_path": (
+            f"s3://{args['datadocs_bucket']}" if args["datadocs_bucket"]
+            else None
+        ),
+        "run_id": get_run_id(),
+        "source_usage": source_usage,
+        "versions": {},
+        "cache": {},
+    }
+
+
+def get_staged_path(context, table):
+    """Retorna o caminho de uma tabela staged."""
+    return f"{context['staged_base']}/{table}/"
+
+
+def get_curated_path(context, table):
+    """Retorna o caminho de uma tabela curated."""
+    return f"{context['curated_base']}/{table}/"
+
+
+def get_cached(context, key, usage, load):
+    """Carrega um DataFrame uma única vez, persistindo se for compartilhado."""
+    if key not in context["cache"]:
+        df = load()
+        if usage > 1:
+            df = df.persist()
+        context["cache"][key] = df
+    return context["cache"][key]
+
+
+def read_staged(context, table):
+    """Lê uma tabela staged (uma vez por execução).
+
+    A leitura usa a versão fixada em get_staged_version, a mesma registrada
+    nos commits curated e usada como fim do Change Data Feed.
+    """
+    version = get_staged_version(context, table)
+    return get_cached(
+        context, ("table", table), context["source_usage"][table],
+        lambda: context["spark"].read.format("delta")
+        .option("versionAsOf", version)
+        .load(get_staged_path(context, table))
+    )
+
+
+def read_staged_changes(context, table, start_version):
+    """Lê o Change Data Feed de uma tabela staged até a versão atual."""
+    end_version = get_staged_version(context, table)
+    return get_cached(
+        context, ("changes", table, start_version),
+        context["source_usage"][table],
+        lambda: read_change_feed(
+            context["spark"], get_staged_path(context, table),
+            start_version, end_version
+        )
+    )
+
+
+def can_read_staged_changes(context, table, start_version):
+    """Indica se o Change Data Feed da tabela staged cobre start_version.
+
+    A leitura é lazy: se o VACUUM já removeu os arquivos _change_data, o
+    erro só aparece na primeira ação, depois de commits parciais. Por isso o
+    commit inicial precisa estar no log e dentro da retenção do VACUUM.
+    """
+    if start_version > get_staged_version(context, table):
+        return True
+    delta_table = DeltaTable.forPath(
+        context["spark"], get_staged_path(context, table)
+    )
+    properties = delta_table.detail().first()["properties"] or {}
+    retention = properties.get(RETENTION_PROPERTY, DEFAULT_RETENTION)
+    retention = retention.strip().lower().removeprefix("interval").strip()
+    return (
+        delta_table.history()
+        .filter(col("version") == start_version)
+        .filter(col("timestamp") >= expr(
+            f"current_timestamp() - INTERVAL {retention}"
+        ))
+        .first()
+    ) is not None
+
+
+def release_cache(context):
+    """Libera os DataFrames persistidos."""
+    for df in context["cache"].values():
+        df.unpersist()
+    context["cache"].clear()
+
+
+def get_staged_version(context, table):
+    """Retorna a versão de uma tabela staged fixada no início do job."""
+    if table not in context["versions"]:
+        context["versions"][table] = get_table_version(
+            context["spark"], get_staged_path(context, table)
+        )
+    return context["versions"][table]
+
+
+def get_commit_metadata(spark, table_path):
+    """Retorna o userMetadata do último commit que o registrou."""
+    if not DeltaTable.isDeltaTable(spark, table_path):
+        return None
+    row = (
+        DeltaTable.forPath(spark, table_path).history()
+        .filter(col("userMetadata").isNotNull())
+        .orderBy(desc("version"))
+        .select("userMetadata")
+        .first()
+    )
+    return json.loads(row["userMetadata"]) if row else None
+
+
+def set_commit_metadata(spark, metadata):
+    """Define o userMetadata dos próximos commits Delta da sessão."""
+    spark.conf.set(USER_METADATA_CONF, json.dumps(metadata))
+
+
+def clear_commit_metadata(spark):
+    """Remove o userMetadata dos commits Delta da sessão."""
+    spark.conf.unset(USER_METADATA_CONF)
+
+
+def read_change_feed(spark, table_path, start_version, end_version):
+    """Lê o Change Data Feed de uma tabela entre duas versões."""
+    return (
+        spark.read.format("delta")
+        .option("readChangeFeed", "true")
+        .option("startingVersion", start_version)
+        .option("endingVersion", end_version)
+        .load(table_path)
+    )
+
+
+def fall_back_from_change_feed(spark, error):
+    """Prepara o recálculo completo quando o Change Data Feed falha.
+
+    Só o CDF indisponível no intervalo (AnalysisException ou arquivo
+    removido pelo VACUUM) leva ao recálculo; outras falhas da JVM
+    (throttling, memória, conflito de commit) são relançadas.
+    """
+    if isinstance(error, Py4JJavaError) and not is_missing_file_error(error):
+        raise error
+    print(f"Change Data Feed indisponível, recalculando: {error}")
+    clear_commit_metadata(spark)
+
+
+def ensure_change_data_feed(spark, table_path):
+    """Habilita o Change Data Feed na tabela curated, se necessário."""
+    if not DeltaTable.isDeltaTable(spark, table_path):
+        return
+    properties = (
+        DeltaTable.forPath(spark, table_path).detail().first()["properties"]
+        or {}
+    )
+    if properties.get(CHANGE_DATA_FEED_PROPERTY) == "true":
+        return
+    spark.sql(
+        f"ALTER TABLE delta.`{table_path}` SET TBLPROPERTIES "
+        f"('{CHANGE_DATA_FEED_PROPERTY}' = 'true')"
+    )
+
+
+def get_partition_column(context, table):
+    """Retorna a coluna de partição da tabela curated (ou None)."""
+    partition = CURATED_TABLES[table].get("partition")
+    if not partition or context["partition_buckets"] <= 0:
+        return None
+    return partition["column"]
+
+
+def add_partition_column(context, table, df):
+    """Adiciona a coluna de bucket de partição, quando configurada."""
+    partition_column = get_partition_column(context, table)
+    if partition_column is None:
+        return df
+    source_column = CURATED_TABLES[table]["partition"]["source"]
+    return df.withColumn(
+        partition_column,
+        pmod(xxhash64(col(source_column)), lit(context["partition_buckets"]))
+    )
+
+
+def has_expected_layout(context, table):
+    """Indica se a tabela curated está particionada como configurado."""
+    partition_column = get_partition_column(context, table)
+    expected = [partition_column] if partition_column else []
+    detail = DeltaTable.forPath(
+        context["spark"], get_curated_path(context, table)
+    ).detail().first()
+    return list(detail["partitionColumns"]) == expected
+
+
+def fingerprint_partitions(df, partition_column):
+    """Calcula contagem e hash do conteúdo de cada partição."""
+    data_columns = sorted(c for c in df.columns if c != partition_column)
+    return df.groupBy(partition_column).agg(
+        count("*").alias("row_count"),
+        spark_sum(xxhash64(*data_columns).cast("decimal(38,0)")).alias(
+            "content_hash"
+        ),
+    )
+
+
+def get_changed_partitions(spark, df, output_path, partition_column):
+    """Retorna as partições cujo conteúdo difere da tabela existente."""
+    current_df = spark.read.format("delta").load(output_path)
+    new_fp = fingerprint_partitions(df, partition_column).alias("new")
+    current_fp = fingerprint_partitions(
+        current_df, partition_column
+    ).alias("current")
+
+    changed = (
+        new_fp.join(current_fp, on=partition_column, how="full_outer")
+        .filter(
+            ~col("new.row_count").eqNullSafe(col("current.row_count"))
+            | ~col("new.content_hash").eqNullSafe(col("current.content_hash"))
+        )
+        .select(partition_column)
+        .collect()
+    )
+    return [row[partition_column] for row in changed]
+
+
+def can_replace_partitions(spark, df, output_path, partition_column):
+    """Indica se a tabela existente aceita substituição por partição."""
+    if not DeltaTable.isDeltaTable(spark, output_path):
+        return False
+    detail = DeltaTable.forPath(spark, output_path).detail().first()
+    current_columns = spark.read.format("delta").load(output_path).columns
+    return (
+        list(detail["partitionColumns"]) == [partition_column]
+        and sorted(current_columns) == sorted(df.columns)
+    )
+
+
+def write_curated_table(df, output_path, partition_column=None):
+    """Escreve tabela curated em formato Delta.
+
+    Tabelas particionadas com o mesmo schema têm apenas as partições
+    alteradas substituídas via replaceWhere.
+    """
+    spark = df.sparkSession
+    if partition_column and can_replace_partitions(
+            spark, df, output_path, partition_column):
+        changed = get_changed_partitions(
+            spark, df, output_path, partition_column
+        )
+        if not changed:
+            # Commit vazio para registrar o userMetadata da execução
+            print(f"Nenhuma partição alterada em {output_path}")
+            df.limit(0).write.format("delta").mode("append").save(output_path)
+            return
+        print(f"Substituindo {len(changed)} partições em {output_path}")
+        predicate = (
+            f"{partition_column} IN ({', '.join(str(v) for v in changed)})"
+        )
+        (
+            df.filter(col(partition_column).isin(changed))
+            .write.format("delta")
+            .mode("overwrite")
+            .option("replaceWhere", predicate)
+            .save(output_path)
+        )
+        return
+
+    writer = (
+        df.write.format("delta")
+        .mode("overwrite")
+        .option("overwriteSchema", "true")
+    )
+    if partition_column:
+        writer = writer.partitionBy(partition_column)
+    writer.save(output_path)
+
+
+def audit_curated_table(context, table, df):
+    """Valida o DataFrame a publicar contra a suite da tabela (auditoria).
+
+    Lança RuntimeError quando a validação falha, antes de qualquer commit.
+    Retorna o resultado e as métricas (None se a tabela não é auditada).
+    """
+    suite_name = CURATED_TABLES[table].get("suite")
+    if not context["audit"] or suite_name is None:
+        return None
+
+    partition_column = get_partition_column(context, table)
+    if partition_column:
+        df = df.drop(partition_column)
+    result, metrics = validate_dataframe(
+        df, table, get_curated_path(context, table), None,
+        SUITES[suite_name], DEFAULT_OPTIONS, context["run_id"]
+    )
+    if context["datadocs_path"]:
+        save_validation_result(
+            context["spark"], context["datadocs_path"], table, result
+        )
+
+    print(f"Auditoria de {table}: {'OK' if result['success'] else 'FALHOU'}")
+    if not result["success"]:
+        print_failed_expectations(result)
+        raise RuntimeError(f"Auditoria de {table} falhou; commit bloqueado")
+    return result, metrics
+
+
+def record_audit(context, table, audit):
+    """Registra a auditoria da tabela publicada no cache do job de DQ."""
+    if audit is None or context["datadocs_path"] is None:
+        return
+    result, metrics = audit
+    spark = context["spark"]
+    suite = SUITES[CURATED_TABLES[table]["suite"]]
+    table_path = get_curated_path(context, table)
+    version = get_table_version(spark, table_path)
+    result["meta"]["batch_spec"]["delta_version"] = version
+    result["meta"]["active_batch_definition"]["batch_identifiers"] = {
+        "delta_version": version
+    }
+    save_cache_entry(spark, context["datadocs_path"], table, suite, {
+        "key": {
+            "table_path": table_path,
+            "version": version,
+            "suite_hash": get_suite_hash(suite, DEFAULT_OPTIONS),
+        },
+        "result": result,
+        "metrics": metrics,
+        "state_versions": {},
+    })
+
+
+def publish_curated_table(context, table, df):
+    """Audita o DataFrame e, se aprovado, reescreve a tabela curated."""
+    df = df.persist()
+    try:
+        audit = audit_curated_table(context, table, df)
+        write_curated_table(
+            df, get_curated_path(context, table),
+            get_partition_column(context, table)
+        )
+    finally:
+        df.unpersist()
+    record_audit(context, table, audit)
+
+
+###############################################################################
+# movie_ratings
+###############################################################################
+def get_rating_bucket():
+    """Retorna o índice do histograma (0..9) para ratings de 0.5 a 5.0."""
+    return least(
+        greatest(spark_round(col("rating") * 2).cast("int") - 1, lit(0)),
+        lit(RATING_BUCKETS - 1),
+    )
+
+
+def aggregate_ratings_state(ratings_df, sign=None, users_sketch=None):
+    """Agrega, em uma única passada, as métricas mergeáveis por filme."""
+    sign = lit(1) if sign is None else sign
+    valid_sign = when(col("rating").isNotNull(), sign).otherwise(0)
+    bucket = get_rating_bucket()
+    users_sketch = (
+        hll_sketch_agg("userid", HLL_LG_CONFIG_K)
+        if users_sketch is None else users_sketch
+    )
+
+    return ratings_df.groupBy("movieid").agg(
+        spark_sum(valid_sign).alias("rating_count"),
+        spark_sum(col("rating") * sign).alias("rating_sum"),
+        spark_sum(col("rating") * col("rating") * sign).alias(
+            "rating_sum_sq"
+        ),
+        array(*[
+            spark_sum(when(bucket == i, valid_sign).otherwise(0))
+            for i in range(RATING_BUCKETS)
+        ]).alias("rating_histogram"),
+        users_sketch.alias("users_sketch"),
+    )
+
+
+def compute_ratings_state(ratings_df):
+    """Calcula o estado agregado de ratings por filme."""
+    return aggregate_ratings_state(ratings_df)
+
+
+def compute_ratings_state_delta(ratings_changes_df, ratings_df):
+    """Converte alterações de ratings em deltas do estado agregado.
+
+    Soma, contagem e histograma aceitam deltas negativos. O sketch HLL não
+    aceita remoções: filmes com deletes têm o sketch recalculado a partir
+    de ratings; os demais recebem a união com os usuários inseridos.
+    """
+    sign = get_change_sign()
+    inserted_user = when(col("_change_type") == "insert", col("userid"))
+    delta_df = aggregate_ratings_state(
+        ratings_changes_df, sign,
+        hll_sketch_agg(inserted_user, HLL_LG_CONFIG_K)
+    )
+
+    deleted_movies_df = (
+        ratings_changes_df
+        .filter(col("_change_type") == "delete")
+        .select("movieid").distinct()
+    )
+    rebuilt_sketches_df = (
+        ratings_df.join(deleted_movies_df, on="movieid")
+        .groupBy("movieid")
+        .agg(hll_sketch_agg("userid", HLL_LG_CONFIG_K).alias(
+            "rebuilt_users_sketch"
+        ))
+    )
+    return delta_df.join(rebuilt_sketches_df, on="movieid", how="left")
+
+
+def merge_ratings_state(spark, state_delta_df, state_path):
+    """Aplica deltas do estado agregado na tabela de estado."""
+    (
+        DeltaTable.forPath(spark, state_path).alias("target")
+        .merge(
+            state_delta_df.alias("source"), "target.movieid = source.movieid"
+        )
+        .whenMatchedDelete(
+            condition="target.rating_count + source.rating_count <= 0"
+        )
+        .whenMatchedUpdate(set={
+            "rating_count": "target.rating_count + source.rating_count",
+            "rating_sum": "target.rating_sum + source.rating_sum",
+            "rating_sum_sq": "target.rating_sum_sq + source.rating_sum_sq",
+            "rating_histogram": (
+                "zip_with(target.rating_histogram, source.rating_histogram, "
+                "(x, y) -> x + y)"
+            ),
+            "users_sketch": (
+                "coalesce(source.rebuilt_users_sketch, "
+                "hll_union(target.users_sketch, source.users_sketch))"
+            ),
+        })
+        .whenNotMatchedInsert(
+            condition="source.rating_count > 0",
+            values={
+                "movieid": "source.movieid",
+                "rating_count": "source.rating_count",
+                "rating_sum": "source.rating_sum",
+                "rating_sum_sq": "source.rating_sum_sq",
+                "rating_histogram": "source.rating_histogram",
+                "users_sketch": (
+                    "coalesce(source.rebuilt_users_sketch, "
+                    "source.users_sketch)"
+                ),
+            }
+        )
+        .execute()
+    )
+
+
+def get_histogram_quantile(quantile):
+    """Gera expressão do quantil a partir do histograma de ratings."""
+    return expr(
+        f"aggregate(sequence(0, {RATING_BUCKETS - 1}), "
+        "named_struct("
+        "'cum', CAST(0 AS BIGINT), 'value', CAST(NULL AS DOUBLE)), "
+        "(acc, i) -> named_struct("
+        "'cum', acc.cum + rating_histogram[i], "
+        "'value', IF(acc.value IS NULL AND "
+        f"acc.cum + rating_histogram[i] >= {quantile} * rating_count, "
+        "(i + 1) * 0.5, acc.value))"
+        ").value"
+    )
+
+
+def get_global_mean_rating(state_df):
+    """Calcula a média global de ratings a partir do estado."""
+    row = state_df.agg(
+        (spark_sum("rating_sum") / spark_sum("rating_count")).alias("mean")
+    ).first()
+    return row["mean"] or 0.0
+
+
+def get_rating_stddev():
+    """Gera o desvio padrão amostral a partir de contagem, soma e quadrados."""
+    n = col("rating_count")
+    return when(n > 1, sqrt(greatest(
+        (col("rating_sum_sq") - col("rating_sum") ** 2 / n) / (n - 1),
+        lit(0.0)
+    )))
+
+
+def split_genres():
+    """Gera a lista de gêneros a partir da coluna genres (separada por |)."""
+    return split(col("genres"), r"\|")
+
+
+def get_genre_mask():
+    """Gera a máscara de bits dos gêneros do filme (bit i = GENRES[i])."""
+    genres = split_genres()
+    return reduce(
+        lambda left, right: left.bitwiseOR(right),
+        [
+            when(array_contains(genres, genre), lit(1 << i)).otherwise(0)
+            for i, genre in enumerate(GENRES)
+        ]
+    )
+
+
+def parse_release_year():
+    """Extrai o ano de lançamento do título (ex.: 'Toy Story (1995)')."""
+    year = regexp_extract(col("title"), r"\((\d{4})\)\s*$", 1)
+    return when(year != "", year.cast("int"))
+
+
+def transform_data(movies_df, state_df, prior_mean, prior_weight):
+    """Monta movie_ratings a partir de movies e do estado agregado."""
+    n = col("rating_count")
+    ratings_agg = state_df.select(
+        "movieid",
+        (col("rating_sum") / n).alias("avg_rating"),
+        n.alias("rating_count"),
+        get_rating_stddev().alias("rating_stddev"),
+        (
+            (lit(prior_weight * prior_mean) + col("rating_sum"))
+            / (lit(prior_weight) + n)
+        ).alias("bayesian_avg_rating"),
+        hll_sketch_estimate("users_sketch").alias("distinct_users"),
+        get_histogram_quantile(0.5).alias("median_rating"),
+        get_histogram_quantile(0.9).alias("p90_rating"),
+    )
+    return (
+        movies_df.select(
+            "movieid", "title", "genres",
+            get_genre_mask().alias("genre_mask"),
+        )
+        .join(ratings_agg, on="movieid", how="left")
+    )
+
+
+def get_movie_ratings_metadata(spark, paths, versions):
+    """Retorna as versões processadas e a versão de estado de movie_ratings.
+
+    state_version fixa o estado usado pela última publicação aprovada de
+    movie_ratings: genre_year_ratings lê essa versão, e não um estado já
+    gravado cuja auditoria de movie_ratings falhou.
+    """
+    return {
+        **versions,
+        "state_version": get_table_version(spark, paths["state"]),
+    }
+
+
+def refresh_movie_ratings_full(context, paths, versions):
+    """Recalcula o estado e sobrescreve movie_ratings."""
+    spark = context["spark"]
+    state_df = compute_ratings_state(read_staged(context, "ratings"))
+
+    set_commit_metadata(spark, {"ratings": versions["ratings"]})
+    write_curated_table(state_df, paths["state"])
+
+    state_df = spark.read.format("delta").load(paths["state"])
+    set_commit_metadata(
+        spark, get_movie_ratings_metadata(spark, paths, versions)
+    )
+    curated_df = add_partition_column(context, "movie_ratings", transform_data(
+        read_staged(context, "movies"), state_df,
+        get_global_mean_rating(state_df), context["bayesian_prior_weight"]
+    ))
+    publish_curated_table(context, "movie_ratings", curated_df)
+    clear_commit_metadata(spark)
+
+
+def refresh_ratings_state(context, paths, versions):
+    """Aplica no estado as alterações de ratings ainda não processadas."""
+    spark = context["spark"]
+    state_version = get_commit_metadata(spark, paths["state"])["ratings"]
+    if state_version >= versions["ratings"]:
+        return
+
+    ratings_changes_df = read_staged_changes(
+        context, "ratings", state_version + 1
+    )
+    state_delta_df = compute_ratings_state_delta(
+        ratings_changes_df, read_staged(context, "ratings")
+    )
+    set_commit_metadata(spark, {"ratings": versions["ratings"]})
+    merge_ratings_state(spark, state_delta_df, paths["state"])
+    clear_commit_metadata(spark)
+
+
+def get_touched_movie_ids(context, curated_versions, versions):
+    """Retorna os movieid alterados desde a última atualização curated."""
+    touched_df = None
+    for table in ("ratings", "movies"):
+        if curated_versions[table] >= versions[table]:
+            continue
+        changes_df = read_staged_changes(
+            context, table, curated_versions[table] + 1
+        ).select("movieid")
+        touched_df = (
+            changes_df if touched_df is None else touched_df.union(changes_df)
+        )
+    return touched_df.distinct() if touched_df is not None else None
+
+
+def merge_movie_ratings(context, touched_df, paths):
+    """Atualiza em movie_ratings apenas os filmes alterados.
+
+    A média bayesiana usa a média global do momento da atualização; filmes
+    não alterados mantêm a média global da sua última atualização até o
+    próximo refresh full.
+    """
+    spark = context["spark"]
+    movies_df = read_staged(context, "movies")
+    state_df = spark.read.format("delta").load(paths["state"])
+
+    updated_df = add_partition_column(context, "movie_ratings", transform_data(
+        movies_df.join(touched_df, on="movieid"), state_df,
+        get_global_mean_rating(state_df), context["bayesian_prior_weight"]
+    )).persist()
+    audit_curated_table(context, "movie_ratings", updated_df)
+
+    source_df = touched_df.join(
+        updated_df.withColumn("_exists", lit(True)), on="movieid", how="left"
+    )
+    values = {c: col(f"source.{c}") for c in updated_df.columns}
+
+    (
+        DeltaTable.forPath(spark, paths["curated"]).alias("target")
+        .merge(source_df.alias("source"), "target.movieid = source.movieid")
+        .whenMatchedDelete(condition="source._exists IS NULL")
+        .whenMatchedUpdate(set=values)
+        .whenNotMatchedInsert(
+            condition="source._exists IS NOT NULL", values=values
+        )
+        .execute()
+    )
+    updated_df.unpersist()
+
+
+def refresh_movie_ratings_incremental(context, paths, versions):
+    """Atualiza estado e movie_ratings a partir do Change Data Feed."""
+    refresh_ratings_state(context, paths, versions)
+
+    curated_versions = get_commit_metadata(context["spark"], paths["curated"])
+    touched_df = get_touched_movie_ids(context, curated_versions, versions)
+    if touched_df is None:
+        print("Nenhuma alteração em ratings/movies desde a última execução.")
+        return
+
+    set_commit_metadata(context["spark"], get_movie_ratings_metadata(
+        context["spark"], paths, versions
+    ))
+    merge_movie_ratings(context, touched_df, paths)
+    clear_commit_metadata(context["spark"])
+
+
+def can_refresh_movie_ratings_incrementally(context, paths):
+    """Indica se há estado, versões processadas e Change Data Feed legível."""
+    spark = context["spark"]
+    state_metadata = get_commit_metadata(spark, paths["state"]) or {}
+    curated_metadata = get_commit_metadata(spark, paths["curated"]) or {}
+    if not ("ratings" in state_metadata
+            and {"ratings", "movies"} <= set(curated_metadata)):
+        return False
+
+    state_df = spark.read.format("delta").load(paths["state"])
+    if not set(RATINGS_STATE_COLUMNS) <= set(state_df.columns):
+        return False
+
+    ratings_start = min(
+        state_metadata["ratings"], curated_metadata["ratings"]
+    ) + 1
+    if not (
+        can_read_staged_changes(context, "ratings", ratings_start)
+        and can_read_staged_changes(
+            context, "movies", curated_metadata["movies"] + 1
+        )
+    ):
+        print("Change Data Feed fora da retenção, recalculando.")
+        return False
+
+    expected_columns = add_partition_column(
+        context, "movie_ratings",
+        transform_data(read_staged(context, "movies"), state_df, 0.0, 0.0)
+    ).columns
+    curated_columns = spark.read.format("delta").load(paths["curated"]).columns
+    return (
+        sorted(expected_columns) == sorted(curated_columns)
+        and has_expected_layout(context, "movie_ratings")
+    )
+
+
+def refresh_movie_ratings(context):
+    """Atualiza movie_ratings (incremental quando possível)."""
+    paths = {
+        "state": get_curated_path(context, "movie_ratings_state"),
+        "curated": get_curated_path(context, "movie_ratings"),
+    }
+    versions = {
+        "ratings": get_staged_version(context, "ratings"),
+        "movies": get_staged_version(context, "movies"),
+    }
+
+    if (context["refresh_mode"] == "incremental"
+            and can_refresh_movie_ratings_incrementally(context, paths)):
+        try:
+            return refresh_movie_ratings_incremental(context, paths, versions)
+        except CHANGE_FEED_ERRORS as e:
+            fall_back_from_change_feed(context["spark"], e)
+
+    refresh_movie_ratings_full(context, paths, versions)
+
+
+###############################################################################
+# movie_genres e genre_year_ratings
+###############################################################################
+def transform_movie_genres(movies_df):
+    """Monta a tabela ponte filme–gênero."""
+    return (
+        movies_df
+        .select("movieid", explode(split_genres()).alias("genre"))
+        .filter(col("genre") != NO_GENRES_LISTED)
+    )
+
+
+def transform_genre_year_ratings(movies_df, state_df):
+    """Agrega as estatísticas de rating por gênero × ano de lançamento.
+
+    Soma, contagem, histograma e sketch HLL do estado por filme são
+    combinados, sem reler a tabela de ratings.
+    """
+    movie_genres_df = (
+        movies_df
+        .select(
+            "movieid",
+            explode(split_genres()).alias("genre"),
+            parse_release_year().alias("release_year"),
+        )
+        .filter(col("genre") != NO_GENRES_LISTED)
+    )
+    stats_df = (
+        movie_genres_df
+        .join(state_df, on="movieid")
+        .groupBy("genre", "release_year")
+        .agg(
+            count("*").alias("movie_count"),
+            spark_sum("rating_count").alias("rating_count"),
+            spark_sum("rating_sum").alias("rating_sum"),
+            spark_sum("rating_sum_sq").alias("rating_sum_sq"),
+            array(*[
+                spark_sum(col("rating_histogram")[i])
+                for i in range(RATING_BUCKETS)
+            ]).alias("rating_histogram"),
+            hll_union_agg("users_sketch").alias("users_sketch"),
+        )
+    )
+    return stats_df.select(
+        "genre",
+        "release_year",
+        "movie_count",
+        "rating_count",
+        (col("rating_sum") / col("rating_count")).alias("avg_rating"),
+        get_rating_stddev().alias("rating_stddev"),
+        hll_sketch_estimate("users_sketch").alias("distinct_users"),
+        get_histogram_quantile(0.5).alias("median_rating"),
+        get_histogram_quantile(0.9).alias("p90_rating"),
+    )
+
+
+def refresh_genre_year_ratings(context):
+    """Recalcula o rollup gênero × ano a partir de movie_ratings_state.
+
+    O estado é lido na versão registrada pela última publicação de
+    movie_ratings (state_version), de modo que o rollup não inclua
+    alterações reprovadas na auditoria de movie_ratings.
+    """
+    spark = context["spark"]
+    metadata = get_commit_metadata(
+        spark, get_curated_path(context, "movie_ratings")
+    ) or {}
+    reader = spark.read.format("delta")
+    if "state_version" in metadata:
+        reader = reader.option("versionAsOf", metadata["state_version"])
+    state_df = reader.load(get_curated_path(context, "movie_ratings_state"))
+    write_curated_table(
+        transform_genre_year_ratings(read_staged(context, "movies"), state_df),
+        get_curated_path(context, "genre_year_ratings")
+    )
+
+
+###############################################################################
+# user_tags
+###############################################################################
+def transform_user_tags(tags_df):
+    """Transforma dados agregando tags por usuário."""
+    return tags_df.groupBy("userid", "tag").agg(
+        count("*").alias("tag_count")
+    )
+
+
+def transform_user_tags_delta(tags_changes_df):
+    """Converte alterações de tags em deltas +1/-1 por (userid, tag)."""
+    return (
+        tags_changes_df
+        .groupBy("userid", "tag")
+        .agg(spark_sum(get_change_sign()).alias("tag_count"))
+        .filter(col("tag_count") != 0)
+    )
+
+
+def apply_user_tags_delta(spark, delta_df, output_path):
+    """Calcula as linhas de user_tags após os deltas (para a auditoria)."""
+    current_df = spark.read.format("delta").load(output_path)
+    return (
+        delta_df.alias("source")
+        .join(
+            current_df.alias("target"),
+            (col("target.userid").eqNullSafe(col("source.userid")))
+            & (col("target.tag").eqNullSafe(col("source.tag"))),
+            "left"
+        )
+        .select(
+            col("source.userid").alias("userid"),
+            col("source.tag").alias("tag"),
+            (
+                coalesce(col("target.tag_count"), lit(0))
+                + col("source.tag_count")
+            ).alias("tag_count"),
+        )
+        .filter(col("tag_count") > 0)
+    )
+
+
+def merge_user_tags_delta(spark, delta_df, output_path):
+    """Aplica deltas de contagem em user_tags."""
+    insert_values = {c: f"source.{c}" for c in delta_df.columns}
+    (
+        DeltaTable.forPath(spark, output_path).alias("target")
+        .merge(
+            delta_df.alias("source"),
+            "target.userid <=> source.userid AND target.tag <=> source.tag"
+        )
+        .whenMatchedDelete(
+            condition="target.tag_count + source.tag_count <= 0"
+        )
+        .whenMatchedUpdate(
+            set={"tag_count": "target.tag_count + source.tag_count"}
+        )
+        .whenNotMatchedInsert(
+            condition="source.tag_count > 0",
+            values=insert_values
+        )
+        .execute()
+    )
+
+
+def refresh_user_tags(context):
+    """Atualiza user_tags (incremental quando possível)."""
+    spark = context["spark"]
+    curated_path = get_curated_path(context, "user_tags")
+    tags_version = get_staged_version(context, "tags")
+    curated_metadata = get_commit_metadata(spark, curated_path) or {}
+
+    incremental = (
+        context["refresh_mode"] == "incremental"
+        and "tags" in curated_metadata
+        and has_expected_layout(context, "user_tags")
+        and can_read_staged_changes(
+            context, "tags", curated_metadata["tags"] + 1
+        )
+    )
+    if incremental:
+        last_version = curated_metadata["tags"]
+        if last_version >= tags_version:
+            print("Nenhuma alteração em tags desde a última execução.")
+            return
+        try:
+            tags_changes_df = read_staged_changes(
+                context, "tags", last_version + 1
+            )
+            set_commit_metadata(spark, {"tags": tags_version})
+            delta_df = add_partition_column(
+                context, "user_tags",
+                transform_user_tags_delta(tags_changes_df)
+            ).persist()
+            audit_curated_table(
+                context, "user_tags",
+                apply_user_tags_delta(spark, delta_df, curated_path)
+            )
+            merge_user_tags_delta(spark, delta_df, curated_path)
+            delta_df.unpersist()
+            clear_commit_metadata(spark)
+            return
+        except CHANGE_FEED_ERRORS as e:
+            fall_back_from_change_feed(spark, e)
+
+    set_commit_metadata(spark, {"tags": tags_version})
+    user_tags_df = add_partition_column(
+        context, "user_tags", transform_user_tags(read_staged(context, "tags"))
+    )
+    publish_curated_table(context, "user_tags", user_tags_df)
+    clear_commit_metadata(spark)
+
+
+###############################################################################
+# Registro das tabelas curated
+###############################################################################
+CURATED_TABLES = {
+    'movie_ratings': {
+        'sources': ['movies', 'ratings'],
+        'refresh': refresh_movie_ratings,
+        'partition': {'column': 'movieid_bucket', 'source': 'movieid'},
+        'suite': SUITE_NAME_MOVIES,
+    },
+    'movie_genres': {
+        'sources': ['movies'],
+        'transform': transform_movie_genres,
+    },
+    'genre_year_ratings': {
+        'sources': ['movies'],
+        'refresh': refresh_genre_year_ratings,
+    },
+    'user_tags': {
+        'sources': ['tags'],
+        'refresh': refresh_user_tags,
+        'partition': {'column': 'userid_bucket', 'source': 'userid'},
+        'suite': SUITE_NAME_TAGS,
+    },
+}
+
+
+def refresh_curated_table(context, table):
+    """Atualiza uma tabela curated conforme seu registro."""
+    entry = CURATED_TABLES[table]
+    if "refresh" in entry:
+        entry["refresh"](context)
+    else:
+        sources = [
+            read_staged(context, source) for source in entry["sources"]
+        ]
+        publish_curated_table(
+            context, table,
+            add_partition_column(context, table, entry["transform"](*sources))
+        )
+    ensure_change_data_feed(context["spark"], get_curated_path(context, table))
+
+
+def run_table(context, table):
+    """Atualiza uma tabela curated e retorna o status."""
+    start = time.time()
+    try:
+        refresh_curated_table(context, table)
+        status, error = "SUCCEEDED", None
+    except Exception as e:
+        status, error = "FAILED", str(e)
+        clear_commit_metadata(context["spark"])
+
+    return {
+        "table": table,
+        "status": status,
+        "duration_seconds": round(time.time() - start, 1),
+        "error": error,
+    }
+
+
+def print_report(results):
+    """Imprime o status de cada tabela curated."""
+    print("Resultado por tabela:")
+    for result in results:
+        print(
+            f"  {result['table']}: {result['status']} "
+            f"({result['duration_seconds']}s)"
+        )
+        if result["error"]:
+            print(f"    └─ {result['error']}")
+
+
+def main():
+    """Função principal do job."""
+    args = get_args()
+    tables = (
+        [table.strip() for table in args["tables"].split(",")]
+        if args["tables"] else list(CURATED_TABLES)
+    )
+
+    spark = init_spark()
+    context = create_context(spark, args, tables)
+    results = [run_table(context, table) for table in tables]
+    release_cache(context)
+    print_report(results)
+
+    failed = [r["table"] for r in results if r["status"] != "SUCCEEDED"]
+    if failed:
+        raise RuntimeError(f"Falha ao atualizar as tabelas: {failed}")
+    print("Tabelas curated atualizadas com sucesso!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+Relatório incremental de Data Quality.
+
+Substitui a reconstrução completa do site de Data Docs do Great
+Expectations: a cada execução, os resultados por expectativa são anexados
+a uma tabela Delta (dq_validation_results), e apenas os artefatos da nova
+execução são escritos: a página da execução (runs/<run_name>.html) e a
+página de resumo (index.html), gerada a partir de dq_metrics_history.
+
+No S3 as páginas são gravadas com boto3 e Content-Type text/html, para
+que o navegador as exiba; outros caminhos (ex.: diretório local file://
+para testes) usam o Hadoop FileSystem.
+
+Toda execução registrada em dq_metrics_history no docs_mode report ganha
+sua página, inclusive quando todas as tabelas vieram do cache; o
+index.html só cria links para as execuções com report_page no histórico.
+"""
+import json
+from html import escape
+from urllib.parse import urlparse
+
+import boto3
+from datahandson_mds_dq_engine import write_text
+from pyspark.sql.functions import col, desc
+
+VALIDATION_RESULTS_SCHEMA = (
+    "run_name string, run_time string, table_name string, "
+    "suite_name string, delta_version bigint, validation_mode string, "
+    "expectation_type string, column_name string, success boolean, "
+    "element_count bigint, unexpected_count bigint, "
+    "unexpected_percent double, observed_value string, details string"
+)
+INDEX_RUNS = 30
+HTML_CONTENT_TYPE = 'text/html; charset=utf-8'
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="pt-BR">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+body {{ font-family: sans-serif; margin: 2em; }}
+table {{ border-collapse: collapse; margin-bottom: 2em; }}
+th, td {{ border: 1px solid #ccc; padding: 4px 8px; text-align: left; }}
+.ok {{ color: #1a7f37; }}
+.fail {{ color: #cf222e; font-weight: bold; }}
+</style>
+</head>
+<body>
+<h1>{title}</h1>
+{body}
+</body>
+</html>
+"""
+
+
+def get_status(success):
+    """Retorna o HTML do status (OK/FALHOU)."""
+    return (
+        '<span class="ok">OK</span>' if success
+        else '<span class="fail">FALHOU</span>'
+    )
+
+
+def render_table(headers, rows):
+    """Renderiza uma tabela HTML (células já escapadas)."""
+    head = "".join(f"<th>{escape(header)}</th>" for header in headers)
+    body = "".join(
+        "<tr>" + "".join(f"<td>{cell}</td>" for cell in row) + "</tr>"
+        for row in rows
+    )
+    return f"<table><tr>{head}</tr>{body}</table>"
+
+
+def build_validation_rows(run_id, runs):
+    """Converte as validações da execução em linhas por expectativa."""
+    rows = []
+    for run in runs:
+        meta = run["result"]["meta"]
+        for expectation in run["result"]["results"]:
+            config = expectation["expectation_config"]
+            result = expectation["result"]
+            observed = result.get("observed_value")
+            details = result.get("details")
+            rows.append((
+                run_id["run_name"],
+                run_id["run_time"],
+                run["table"],
+                run["suite_name"],
+                meta["batch_spec"]["delta_version"],
+                run["mode"],
+                config["expectation_type"],
+                config["kwargs"].get("column"),
+                expectation["success"],
+                result.get("element_count"),
+                result.get("unexpected_count"),
+                result.get("unexpected_percent"),
+                None if observed is None
+                else json.dumps(observed, default=str),
+                json.dumps(details, default=str) if details else None,
+            ))
+    return rows
+
+
+def append_validation_results(spark, results_path, run_id, runs):
+    """Anexa os resultados por expectativa à tabela Delta colunar."""
+    (
+        spark.createDataFrame(
+            build_validation_rows(run_id, runs), VALIDATION_RESULTS_SCHEMA
+        )
+        .withColumn("run_time", col("run_time").cast("timestamp"))
+        .write.format("delta")
+        .mode("append")
+        .save(results_path)
+    )
+
+
+def render_run_page(run_id, runs):
+    """Renderiza a página de uma execução (uma seção por tabela/suite)."""
+    sections = []
+    for run in runs:
+        result = run["result"]
+        version = result["meta"]["batch_spec"]["delta_version"]
+        rows = []
+        for expectation in result["results"]:
+            config = expectation["expectation_config"]
+            details = {
+                key: value for key, value in expectation["result"].items()
+                if key != "partial_unexpected_list"
+            }
+            rows.append([
+                get_status(expectation["success"]),
+                escape(config["expectation_type"]),
+                escape(json.dumps(config["kwargs"], default=str)),
+                escape(json.dumps(details, default=str)),
+            ])
+        sections.append(
+            f"<h2>{escape(run['table'])} ({escape(run['suite_name'])}) "
+            f"{get_status(result['success'])}</h2>"
+            f"<p>Versão Delta {version}"
+            f" · modo {escape(run['mode'])} · {run['rows_read']} linhas lidas"
+            f" · {run['duration_seconds']}s</p>"
+            + render_table(
+                ["Status", "Expectativa", "Parâmetros", "Resultado"], rows
+            )
+        )
+    return PAGE_TEMPLATE.format(
+        title=escape(f"Data Quality - {run_id['run_name']}"),
+        body="".join(sections) + '<p><a href="../index.html">Resumo</a></p>',
+    )
+
+
+def get_run_link(history_row):
+    """Retorna o link da página da execução (texto se ela não existe).
+
+    Execuções em docs_mode ge/none e linhas anteriores à coluna report_page
+    não têm página no relatório.
+    """
+    run_name = escape(history_row["run_name"])
+    if not history_row.get("report_page"):
+        return run_name
+    return f'<a href="runs/{run_name}.html">{run_name}</a>'
+
+
+def render_index_page(history_rows):
+    """Renderiza o resumo das últimas execuções a partir do histórico."""
+    rows = [
+        [
+            get_run_link(row),
+            escape(row["table_name"]),
+            escape(row["suite_name"]),
+            get_status(row["success"]),
+            f'{row["successful_expectations"]}/'
+            f'{row["evaluated_expectations"]}',
+            escape(row["validation_mode"]),
+            str(row["delta_version"]),
+            str(row["rows_read"]),
+            str(row["duration_seconds"]),
+        ]
+        for row in history_rows
+    ]
+    return PAGE_TEMPLATE.format(
+        title="Data Quality - últimas execuções",
+        body=render_table(
+            [
+                "Execução", "Tabela", "Suite", "Status", "Expectativas",
+                "Modo", "Versão", "Linhas lidas", "Duração (s)",
+            ],
+            rows
+        ),
+    )
+
+
+def load_recent_history(spark, history_path, max_runs=INDEX_RUNS):
+    """Lê do histórico as linhas das últimas execuções."""
+    history_df = spark.read.format("delta").load(history_path)
+    recent_runs = [
+        row["run_name"] for row in (
+            history_df.select("run_name", "run_time").distinct()
+            .orderBy(desc("run_time"))
+            .limit(max_runs)
+            .collect()
+        )
+    ]
+    return [
+        row.asDict() for row in (
+            history_df.filter(col("run_name").isin(recent_runs))
+            .orderBy(desc("run_time"), "table_name", "suite_name")
+            .collect()
+        )
+    ]
+
+
+def write_html(spark, path, content):
+    """Grava uma página HTML (boto3 no S3, Hadoop FileSystem nos demais).
+
+    O S3A grava os objetos como binary/octet-stream, e o navegador baixa a
+    página em vez de exibi-la.
+    """
+    url = urlparse(path)
+    if url.scheme not in ("s3", "s3a"):
+        write_text(spark, path, content)
+        return
+    boto3.client("s3").put_object(
+        Bucket=url.netloc, Key=url.path.lstrip("/"),
+        Body=content.encode("utf-8"), ContentType=HTML_CONTENT_TYPE,
+    )
+
+
+def publish_index(spark, report_path, history_path):
+    """Atualiza a página de resumo a partir de dq_metrics_history."""
+    write_html(
+        spark, f"{report_path}/index.html",
+        render_index_page(load_recent_history(spark, history_path))
+    )
+
+
+def publish_report(spark, report_path, history_path, run_id, runs):
+    """Escreve a página da execução e atualiza a página de resumo."""
+    write_html(
+        spark, f"{report_path}/runs/{run_id['run_name']}.html",
+        render_run_page(run_id, runs)
+    )
+    publish_index(spark, report_path, history_path)
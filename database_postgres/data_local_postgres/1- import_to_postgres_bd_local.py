@@ -2,14 +2,33 @@
 """
 Script para importar CSVs do MovieLens para PostgreSQL local.
 
+Cada CSV é enviado em streaming para COPY ... FROM STDIN, em blocos de
+tamanho fixo, sem carregar o arquivo em memória. As tabelas são criadas
+tipadas; chaves primárias e índices são criados depois da carga, e as
+quatro tabelas são carregadas em paralelo, uma conexão por tabela.
+
+Um manifesto (SHA-256 e número de linhas de cada CSV) é gravado em
+etl_control.movielens_load_state. CSVs inalterados são ignorados; quando
+um CSV muda, ele é carregado em uma tabela temporária e apenas a
+diferença é aplicada (upsert das linhas novas/alteradas e remoção das
+ausentes), sem recriar a tabela.
+
 Usage:
     python3 "1- import_to_postgres_bd_local.py"
+
+Variáveis opcionais:
+    DATA_DIR: diretório dos CSVs (padrão: ../ml-latest-small)
+    COPY_CHUNK_SIZE: bytes lidos por bloco do COPY (padrão: 1 MiB)
+    MAX_PARALLEL_LOADS: tabelas carregadas em paralelo (padrão: 4)
+    FORCE_RELOAD: true recria e recarrega todas as tabelas
 """
+import hashlib
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-import pandas as pd
 from dotenv import load_dotenv
-from sqlalchemy import Column, MetaData, String, Table, create_engine, text
+from sqlalchemy import create_engine
 
 # Carregar variáveis de ambiente do arquivo .env
 load_dotenv()
@@ -21,6 +40,66 @@ DATABASE = os.getenv('DB_NAME')
 USER = os.getenv('DB_USER')
 PASSWORD = os.getenv('DB_PASSWORD')
 
+DATA_DIR = os.getenv(
+    'DATA_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                 '..', 'ml-latest-small')
+)
+COPY_CHUNK_SIZE = int(os.getenv('COPY_CHUNK_SIZE', 1024 * 1024))
+MAX_PARALLEL_LOADS = int(os.getenv('MAX_PARALLEL_LOADS', 4))
+FORCE_RELOAD = os.getenv('FORCE_RELOAD', 'false').lower() == 'true'
+
+# Tabela de controle (manifesto das cargas), fora do schema public
+STATE_SCHEMA = 'etl_control'
+STATE_TABLE = f'{STATE_SCHEMA}.movielens_load_state'
+
+# Schema tipado de cada tabela; as colunas seguem o cabeçalho dos CSVs.
+# imdbId é texto para preservar os zeros à esquerda.
+TABLES = {
+    'movies': {
+        'arquivo': 'movies.csv',
+        'colunas': [
+            ('movieId', 'integer NOT NULL'),
+            ('title', 'text'),
+            ('genres', 'text'),
+        ],
+        'primary_key': ['movieId'],
+        'indices': [],
+    },
+    'ratings': {
+        'arquivo': 'ratings.csv',
+        'colunas': [
+            ('userId', 'integer NOT NULL'),
+            ('movieId', 'integer NOT NULL'),
+            ('rating', 'numeric(2, 1)'),
+            ('timestamp', 'bigint'),
+        ],
+        'primary_key': ['userId', 'movieId'],
+        'indices': [['movieId']],
+    },
+    'tags': {
+        'arquivo': 'tags.csv',
+        'colunas': [
+            ('userId', 'integer NOT NULL'),
+            ('movieId', 'integer NOT NULL'),
+            ('tag', 'text'),
+            ('timestamp', 'bigint'),
+        ],
+        'primary_key': ['userId', 'movieId', 'tag'],
+        'indices': [['movieId']],
+    },
+    'links': {
+        'arquivo': 'links.csv',
+        'colunas': [
+            ('movieId', 'integer NOT NULL'),
+            ('imdbId', 'text'),
+            ('tmdbId', 'integer'),
+        ],
+        'primary_key': ['movieId'],
+        'indices': [],
+    },
+}
+
 
 def validate_env_vars():
     """Valida se todas as variáveis de ambiente foram carregadas."""
@@ -36,31 +115,238 @@ def get_connection_string():
     return f'postgresql://{USER}:{PASSWORD}@{HOST}:{PORT}/{DATABASE}'
 
 
-def import_csv_to_table(engine, metadata, arquivo, tabela_nome):
-    """Importa um arquivo CSV para uma tabela no PostgreSQL."""
-    caminho = f'ml-latest-small/{arquivo}'
+def quote_columns(colunas):
+    """Retorna a lista de colunas entre aspas, separadas por vírgula."""
+    return ', '.join(f'"{coluna}"' for coluna in colunas)
+
+
+def get_create_table_sql(tabela_nome, config):
+    """Retorna o CREATE TABLE tipado, sem chaves nem índices."""
+    colunas = ', '.join(
+        f'"{coluna}" {tipo}' for coluna, tipo in config['colunas']
+    )
+    return f'CREATE TABLE {tabela_nome} ({colunas})'
+
+
+def get_index_sql(tabela_nome, config):
+    """Retorna os comandos de chave primária e índices da tabela."""
+    comandos = []
+    if config['primary_key']:
+        comandos.append(
+            f'ALTER TABLE {tabela_nome} ADD PRIMARY KEY '
+            f'({quote_columns(config["primary_key"])})'
+        )
+    for colunas in config['indices']:
+        nome = f'{tabela_nome}_{"_".join(colunas).lower()}_idx'
+        comandos.append(
+            f'CREATE INDEX {nome} ON {tabela_nome} '
+            f'({quote_columns(colunas)})'
+        )
+    return comandos
+
+
+def get_file_manifest(caminho):
+    """Calcula o SHA-256, o tamanho e as linhas de dados do CSV."""
+    sha256 = hashlib.sha256()
+    tamanho = 0
+    quebras = 0
+    ultimo = b'\n'
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(COPY_CHUNK_SIZE), b''):
+            sha256.update(bloco)
+            tamanho += len(bloco)
+            quebras += bloco.count(b'\n')
+            ultimo = bloco[-1:]
+    linhas = quebras + (0 if ultimo == b'\n' else 1)
+    return {
+        'sha256': sha256.hexdigest(),
+        'size': tamanho,
+        'rows': max(linhas - 1, 0),
+    }
 
-    print(f"Importando {arquivo}...")
 
-    # Ler CSV
-    df = pd.read_csv(caminho)
+def get_schema_hash(tabela_nome, config):
+    """Retorna o hash do DDL da tabela (colunas, chave e índices)."""
+    ddl = [get_create_table_sql(tabela_nome, config)]
+    ddl += get_index_sql(tabela_nome, config)
+    return hashlib.sha256('\n'.join(ddl).encode()).hexdigest()
 
-    # Deletar tabela se existir
-    with engine.connect() as conn:
-        conn.execute(text(f'DROP TABLE IF EXISTS {tabela_nome}'))
+
+def ensure_state_table(engine):
+    """Cria a tabela de controle das cargas, se não existir."""
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f'CREATE SCHEMA IF NOT EXISTS {STATE_SCHEMA}')
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {STATE_TABLE} ('
+                'table_name text PRIMARY KEY, source_key text, '
+                'content_hash text, schema_hash text, rows bigint, '
+                'loaded_at timestamptz)'
+            )
         conn.commit()
+    finally:
+        conn.close()
+
 
-    # Criar lista de colunas para SQLAlchemy
-    colunas = [Column(col, String) for col in df.columns]
+def get_load_state(cursor, tabela_nome):
+    """Retorna (content_hash, schema_hash) da última carga da tabela."""
+    cursor.execute(
+        f'SELECT content_hash, schema_hash FROM {STATE_TABLE} '
+        'WHERE table_name = %s AND to_regclass(%s) IS NOT NULL',
+        (tabela_nome, tabela_nome),
+    )
+    return cursor.fetchone()
 
-    # Criar tabela usando SQLAlchemy
-    tabela = Table(tabela_nome, metadata, *colunas, extend_existing=True)
-    tabela.create(engine)
 
-    # Inserir dados usando pandas to_sql
-    df.to_sql(tabela_nome, engine, if_exists='append', index=False)
+def save_load_state(cursor, tabela_nome, caminho, manifest, schema_hash):
+    """Grava o manifesto da carga na tabela de controle."""
+    cursor.execute(
+        f'INSERT INTO {STATE_TABLE} (table_name, source_key, content_hash, '
+        'schema_hash, rows, loaded_at) VALUES (%s, %s, %s, %s, %s, now()) '
+        'ON CONFLICT (table_name) DO UPDATE SET '
+        'source_key = EXCLUDED.source_key, '
+        'content_hash = EXCLUDED.content_hash, '
+        'schema_hash = EXCLUDED.schema_hash, rows = EXCLUDED.rows, '
+        'loaded_at = EXCLUDED.loaded_at',
+        (tabela_nome, caminho, manifest['sha256'], schema_hash,
+         manifest['rows']),
+    )
 
-    print(f"{arquivo} importado com sucesso ({len(df)} linhas)\n")
+
+def get_diff_sql(tabela_nome, staging, config):
+    """Retorna o upsert das linhas alteradas e o delete das removidas."""
+    colunas = [coluna for coluna, _ in config['colunas']]
+    chave = config['primary_key']
+    valores = [coluna for coluna in colunas if coluna not in chave]
+    if valores:
+        acao = (
+            'DO UPDATE SET '
+            + ', '.join(f'"{c}" = EXCLUDED."{c}"' for c in valores)
+            + ' WHERE ROW('
+            + ', '.join(f'{tabela_nome}."{c}"' for c in valores)
+            + ') IS DISTINCT FROM ROW('
+            + ', '.join(f'EXCLUDED."{c}"' for c in valores)
+            + ')'
+        )
+    else:
+        acao = 'DO NOTHING'
+    upsert = (
+        f'INSERT INTO {tabela_nome} ({quote_columns(colunas)}) '
+        f'SELECT {quote_columns(colunas)} FROM {staging} '
+        f'ON CONFLICT ({quote_columns(chave)}) {acao}'
+    )
+    delete = (
+        f'DELETE FROM {tabela_nome} t WHERE NOT EXISTS ('
+        f'SELECT 1 FROM {staging} s WHERE '
+        + ' AND '.join(f's."{c}" = t."{c}"' for c in chave)
+        + ')'
+    )
+    return upsert, delete
+
+
+def copy_csv_to_table(cursor, caminho, tabela_nome, config):
+    """Envia o CSV em streaming para COPY ... FROM STDIN."""
+    colunas = quote_columns(coluna for coluna, _ in config['colunas'])
+    with open(caminho, encoding='utf-8') as arquivo:
+        cursor.copy_expert(
+            f'COPY {tabela_nome} ({colunas}) '
+            f'FROM STDIN WITH (FORMAT csv, HEADER true)',
+            arquivo,
+            size=COPY_CHUNK_SIZE,
+        )
+    return cursor.rowcount
+
+
+def full_load(cursor, caminho, tabela_nome, config):
+    """Recria a tabela e carrega o CSV inteiro."""
+    cursor.execute(f'DROP TABLE IF EXISTS {tabela_nome}')
+    cursor.execute(get_create_table_sql(tabela_nome, config))
+    linhas = copy_csv_to_table(cursor, caminho, tabela_nome, config)
+    for comando in get_index_sql(tabela_nome, config):
+        cursor.execute(comando)
+    return linhas, f"{linhas:,} linhas"
+
+
+def diff_load(cursor, caminho, tabela_nome, config):
+    """Carrega o CSV em uma tabela temporária e aplica só a diferença."""
+    staging = f'{tabela_nome}_staging'
+    cursor.execute(
+        f'CREATE TEMP TABLE {staging} (LIKE {tabela_nome}) ON COMMIT DROP'
+    )
+    linhas = copy_csv_to_table(cursor, caminho, staging, config)
+    cursor.execute(f'ANALYZE {staging}')
+    upsert, delete = get_diff_sql(tabela_nome, staging, config)
+    cursor.execute(upsert)
+    alteradas = cursor.rowcount
+    cursor.execute(delete)
+    removidas = cursor.rowcount
+    return linhas, (
+        f"{linhas:,} linhas lidas, {alteradas:,} inseridas/atualizadas, "
+        f"{removidas:,} removidas"
+    )
+
+
+def import_csv_to_table(engine, tabela_nome, config):
+    """Importa um arquivo CSV para uma tabela no PostgreSQL.
+
+    CSV inalterado (mesmo SHA-256 e DDL) é ignorado; tabela já carregada
+    com o mesmo DDL recebe apenas a diferença; caso contrário, a tabela é
+    recriada. Tudo em uma única transação: quem consulta continua vendo a
+    versão anterior até o COMMIT.
+    """
+    caminho = os.path.join(DATA_DIR, config['arquivo'])
+    manifest = get_file_manifest(caminho)
+    schema_hash = get_schema_hash(tabela_nome, config)
+    inicio = time.time()
+
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor() as cursor:
+            estado = None if FORCE_RELOAD else get_load_state(
+                cursor, tabela_nome
+            )
+            if estado == (manifest['sha256'], schema_hash):
+                print(f"{config['arquivo']} inalterado, ignorando\n")
+                return 0
+
+            if estado and estado[1] == schema_hash:
+                print(f"Aplicando diferenças de {config['arquivo']}...")
+                linhas, resumo = diff_load(
+                    cursor, caminho, tabela_nome, config
+                )
+            else:
+                print(f"Importando {config['arquivo']}...")
+                linhas, resumo = full_load(
+                    cursor, caminho, tabela_nome, config
+                )
+            if linhas != manifest['rows']:
+                print(
+                    f"Aviso: {config['arquivo']} tem {manifest['rows']:,} "
+                    f"linhas no manifesto e {linhas:,} carregadas"
+                )
+            save_load_state(
+                cursor, tabela_nome, caminho, manifest, schema_hash
+            )
+        conn.commit()
+
+        # ANALYZE fora da transação da carga, para o planner já ter
+        # estatísticas das tabelas novas
+        with conn.cursor() as cursor:
+            cursor.execute(f'ANALYZE {tabela_nome}')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    duracao = time.time() - inicio
+    print(
+        f"{config['arquivo']} importado com sucesso ({resumo}, "
+        f"{duracao:.1f}s, {linhas / max(duracao, 1e-6):,.0f} linhas/s)\n"
+    )
+    return linhas
 
 
 def main():
@@ -70,25 +356,25 @@ def main():
     connection_string = get_connection_string()
 
     print("Conectando ao banco de dados...")
-    engine = create_engine(connection_string)
-    metadata = MetaData()
+    engine = create_engine(
+        connection_string, pool_size=max(MAX_PARALLEL_LOADS, 1)
+    )
     print("Conectado com sucesso\n")
+    ensure_state_table(engine)
 
-    # Lista de arquivos para importar
-    arquivos = [
-        ('movies.csv', 'movies'),
-        ('ratings.csv', 'ratings'),
-        ('tags.csv', 'tags'),
-        ('links.csv', 'links')
-    ]
-
-    # Importar todos os arquivos
-    for arquivo, tabela_nome in arquivos:
-        import_csv_to_table(engine, metadata, arquivo, tabela_nome)
+    # Importar todos os arquivos em paralelo, uma conexão por tabela
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL_LOADS) as executor:
+        futures = {
+            tabela_nome: executor.submit(
+                import_csv_to_table, engine, tabela_nome, config
+            )
+            for tabela_nome, config in TABLES.items()
+        }
+        total = sum(future.result() for future in futures.values())
 
     # Fechar conexão
     engine.dispose()
-    print("Todos os arquivos foram importados!")
+    print(f"Todos os arquivos foram importados! ({total:,} linhas)")
 
 
 if __name__ == "__main__":
@@ -2,13 +2,24 @@
 """
 Script para verificar tabelas no PostgreSQL local.
 
+As contagens vêm das estimativas do catálogo (pg_class.reltuples e
+pg_stat_user_tables), sem varrer as tabelas; o tamanho vem de
+pg_total_relation_size. Cada coluna é perfilada com a fração de nulos e
+o n_distinct de pg_stats. As tabelas são inspecionadas em paralelo e o
+resultado sai em um único relatório.
+
 Usage:
     python3 2-check_tables.py
+
+Variáveis opcionais:
+    EXACT_COUNT: true executa também SELECT COUNT(*) em cada tabela
+    MAX_PARALLEL_CHECKS: tabelas inspecionadas em paralelo (padrão: 4)
 """
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, inspect, text
+from sqlalchemy import create_engine, text
 
 # Carregar variáveis de ambiente
 load_dotenv()
@@ -20,6 +31,43 @@ DATABASE = os.getenv('DB_NAME')
 USER = os.getenv('DB_USER')
 PASSWORD = os.getenv('DB_PASSWORD')
 
+EXACT_COUNT = os.getenv('EXACT_COUNT', 'false').lower() == 'true'
+MAX_PARALLEL_CHECKS = int(os.getenv('MAX_PARALLEL_CHECKS', 4))
+
+# Estatísticas das tabelas do schema public a partir do catálogo.
+# reltuples é -1 em tabelas nunca analisadas; nesse caso usa n_live_tup.
+TABLE_STATS_SQL = """
+SELECT c.relname AS table_name,
+       CASE WHEN c.reltuples >= 0 THEN c.reltuples::bigint
+            ELSE s.n_live_tup END AS estimated_rows,
+       s.n_live_tup AS live_rows,
+       s.n_dead_tup AS dead_rows,
+       greatest(s.last_analyze, s.last_autoanalyze) AS last_analyze,
+       pg_total_relation_size(c.oid) AS total_bytes
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p')
+ORDER BY c.relname
+"""
+
+# Colunas da tabela com o perfil de pg_stats (vazio se não analisada)
+COLUMN_STATS_SQL = """
+SELECT a.attname AS column_name,
+       format_type(a.atttypid, a.atttypmod) AS data_type,
+       st.null_frac,
+       st.n_distinct
+FROM pg_attribute a
+LEFT JOIN pg_stats st
+       ON st.schemaname = 'public'
+      AND st.tablename = :table
+      AND st.attname = a.attname
+WHERE a.attrelid = to_regclass(:qualified_table)
+  AND a.attnum > 0
+  AND NOT a.attisdropped
+ORDER BY a.attnum
+"""
+
 
 def validate_env_vars():
     """Valida se todas as variáveis de ambiente foram carregadas."""
@@ -35,20 +83,69 @@ def get_connection_string():
     return f'postgresql://{USER}:{PASSWORD}@{HOST}:{PORT}/{DATABASE}'
 
 
-def print_table_info(engine, inspector, table):
-    """Imprime informações de uma tabela."""
-    print(f"✅ Tabela: {table}")
+def get_table_stats(engine):
+    """Retorna as estimativas do catálogo de todas as tabelas."""
+    with engine.connect() as conn:
+        return [
+            dict(row._mapping) for row in conn.execute(text(TABLE_STATS_SQL))
+        ]
 
-    # Contar registros
+
+def format_distinct(n_distinct, rows):
+    """Converte o n_distinct de pg_stats em número de valores distintos.
+
+    Valores negativos são uma fração das linhas (-1 = todos distintos).
+    """
+    if n_distinct is None:
+        return "-"
+    if n_distinct < 0:
+        return f"~{-n_distinct * (rows or 0):,.0f}"
+    return f"{n_distinct:,.0f}"
+
+
+def inspect_table(engine, table_stats):
+    """Perfila as colunas da tabela (e conta as linhas, se pedido)."""
+    table = table_stats['table_name']
     with engine.connect() as conn:
-        result = conn.execute(text(f"SELECT COUNT(*) FROM {table}"))
-        count = result.scalar()
-        print(f"   └─ Registros: {count:,}")
-
-    # Mostrar colunas
-    columns = inspector.get_columns(table)
-    column_names = ', '.join([col['name'] for col in columns])
-    print(f"   └─ Colunas: {column_names}")
+        columns = [
+            dict(row._mapping) for row in conn.execute(
+                text(COLUMN_STATS_SQL),
+                {"table": table, "qualified_table": f'public."{table}"'},
+            )
+        ]
+        exact_rows = None
+        if EXACT_COUNT:
+            exact_rows = conn.execute(
+                text(f'SELECT COUNT(*) FROM public."{table}"')
+            ).scalar()
+    return {**table_stats, "columns": columns, "exact_rows": exact_rows}
+
+
+def print_table_info(info):
+    """Imprime informações de uma tabela."""
+    print(f"✅ Tabela: {info['table_name']}")
+
+    estimated = info['estimated_rows'] or 0
+    print(f"   └─ Registros (estimativa): {estimated:,}")
+    if info['exact_rows'] is not None:
+        print(f"   └─ Registros (exato): {info['exact_rows']:,}")
+    print(
+        f"   └─ Tamanho total: {info['total_bytes'] / (1024 * 1024):,.1f} MB"
+        f" (linhas mortas: {info['dead_rows'] or 0:,})"
+    )
+    print(f"   └─ Último ANALYZE: {info['last_analyze'] or 'nunca'}")
+
+    print("   └─ Colunas:")
+    for column in info['columns']:
+        null_frac = (
+            "-" if column['null_frac'] is None
+            else f"{column['null_frac']:.1%}"
+        )
+        distinct = format_distinct(column['n_distinct'], estimated)
+        print(
+            f"      • {column['column_name']} ({column['data_type']}): "
+            f"nulos {null_frac}, distintos {distinct}"
+        )
     print()
 
 
@@ -59,24 +156,36 @@ def main():
     connection_string = get_connection_string()
 
     print("Conectando ao banco de dados...")
-    engine = create_engine(connection_string)
+    engine = create_engine(
+        connection_string, pool_size=max(MAX_PARALLEL_CHECKS, 1)
+    )
+
+    # Estimativas de todas as tabelas em uma consulta ao catálogo
+    tables = get_table_stats(engine)
 
-    # Verificar tabelas
-    inspector = inspect(engine)
-    tables = inspector.get_table_names()
+    # Perfil das colunas (e contagem exata, se pedida) em paralelo
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL_CHECKS) as executor:
+        infos = list(executor.map(
+            lambda table_stats: inspect_table(engine, table_stats), tables
+        ))
 
     print(f"\n{'=' * 60}")
     print(f"TABELAS NO BANCO DE DADOS: {DATABASE}")
     print(f"{'=' * 60}\n")
 
-    if not tables:
+    if not infos:
         print("Nenhuma tabela encontrada!")
     else:
-        for table in tables:
-            print_table_info(engine, inspector, table)
+        for info in infos:
+            print_table_info(info)
+        if any(info['last_analyze'] is None for info in infos):
+            print(
+                "Dica: tabelas sem ANALYZE não têm estimativas nem perfil "
+                "das colunas; execute ANALYZE ou use EXACT_COUNT=true.\n"
+            )
 
     print(f"{'=' * 60}")
-    print(f"Total de tabelas: {len(tables)}")
+    print(f"Total de tabelas: {len(infos)}")
     print(f"{'=' * 60}")
 
     engine.dispose()
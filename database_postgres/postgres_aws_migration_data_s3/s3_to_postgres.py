@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+"""
+Migração dos CSVs do MovieLens do S3 para o PostgreSQL (RDS).
+
+Cada objeto é lido do S3 em blocos (GET com Range) e enviado em streaming
+para COPY ... FROM STDIN, sem carregar o arquivo em memória. As tabelas
+são criadas tipadas, com chaves primárias e índices criados após a carga,
+e carregadas em paralelo, uma conexão por tabela.
+
+A carga é retomável e incremental: cada tabela é carregada em uma única
+transação, que também grava o manifesto (hash do conteúdo, hash do DDL e
+linhas) na tabela de controle etl_control.movielens_load_state (fora do
+schema public replicado pelo DMS). O hash do conteúdo é o SHA-256 gravado
+como metadado pelo upload_csvs_to_s3.py (ou o ETag, na falta dele). Ao
+reexecutar, tabelas inalteradas são ignoradas; tabelas alteradas recebem
+só a diferença (upsert das linhas novas/alteradas e remoção das
+ausentes), o que evita reprocessar tudo no DMS e nos jobs Glue.
+
+Usage:
+    export RDS_SECRET_ARN=arn:aws:secretsmanager:...
+    export RDS_HOST=your-rds-host.rds.amazonaws.com
+    export S3_BUCKET=your-bucket-name
+    python3 s3_to_postgres.py
+
+Variáveis opcionais:
+    S3_PREFIX: prefixo dos CSVs (padrão: movielens-source-data)
+    DB_NAME / DB_PORT: banco e porta (padrão: transactional / 5432)
+    DB_USER / DB_PASSWORD: credenciais diretas, no lugar do secret
+        (ex.: Postgres local do docker-compose)
+    S3_ENDPOINT_URL: endpoint S3 alternativo (ex.: moto_server local)
+    LOAD_TABLES: tabelas a carregar (padrão: ratings,tags,movies,links)
+    RANGE_CHUNK_SIZE: bytes por GET/bloco do COPY (padrão: 8 MiB)
+    MAX_PARALLEL_LOADS: tabelas carregadas em paralelo (padrão: 4)
+    FORCE_RELOAD: true recria e recarrega todas as tabelas
+"""
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+import psycopg2
+
+AWS_REGION = os.getenv('AWS_REGION', 'us-east-1')
+S3_BUCKET = os.getenv('S3_BUCKET')
+S3_PREFIX = os.getenv('S3_PREFIX', 'movielens-source-data')
+S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL')
+SECRET_ARN = os.getenv('RDS_SECRET_ARN')
+DB_HOST = os.getenv('RDS_HOST', os.getenv('DB_HOST'))
+DB_PORT = int(os.getenv('DB_PORT', 5432))
+DB_NAME = os.getenv('DB_NAME', 'transactional')
+LOAD_TABLES = os.getenv('LOAD_TABLES', 'ratings,tags,movies,links')
+RANGE_CHUNK_SIZE = int(os.getenv('RANGE_CHUNK_SIZE', 8 * 1024 * 1024))
+MAX_PARALLEL_LOADS = int(os.getenv('MAX_PARALLEL_LOADS', 4))
+FORCE_RELOAD = os.getenv('FORCE_RELOAD', 'false').lower() == 'true'
+
+STATE_SCHEMA = 'etl_control'
+STATE_TABLE = f'{STATE_SCHEMA}.movielens_load_state'
+
+# Schema tipado de cada tabela; as colunas seguem o cabeçalho dos CSVs.
+# imdbId é texto para preservar os zeros à esquerda.
+TABLES = {
+    'movies': {
+        'columns': [
+            ('movieId', 'integer NOT NULL'),
+            ('title', 'text'),
+            ('genres', 'text'),
+        ],
+        'primary_key': ['movieId'],
+        'indexes': [],
+    },
+    'ratings': {
+        'columns': [
+            ('userId', 'integer NOT NULL'),
+            ('movieId', 'integer NOT NULL'),
+            ('rating', 'numeric(2, 1)'),
+            ('timestamp', 'bigint'),
+        ],
+        'primary_key': ['userId', 'movieId'],
+        'indexes': [['movieId']],
+    },
+    'tags': {
+        'columns': [
+            ('userId', 'integer NOT NULL'),
+            ('movieId', 'integer NOT NULL'),
+            ('tag', 'text'),
+            ('timestamp', 'bigint'),
+        ],
+        'primary_key': ['userId', 'movieId', 'tag'],
+        'indexes': [['movieId']],
+    },
+    'links': {
+        'columns': [
+            ('movieId', 'integer NOT NULL'),
+            ('imdbId', 'text'),
+            ('tmdbId', 'integer'),
+        ],
+        'primary_key': ['movieId'],
+        'indexes': [],
+    },
+}
+
+
+class S3RangeReader:
+    """Leitor de objeto S3 em blocos, no formato esperado pelo COPY.
+
+    Cada bloco é um GET com Range e If-Match no ETag lido no início, para
+    falhar se o objeto for substituído no meio da carga.
+    """
+
+    def __init__(self, s3_client, bucket, key, chunk_size):
+        head = s3_client.head_object(Bucket=bucket, Key=key)
+        self.head = head
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.chunk_size = chunk_size
+        self.size = head['ContentLength']
+        self.etag = head['ETag']
+        self.position = 0
+        self.buffer = b''
+
+    def fetch_range(self):
+        """Lê o próximo bloco do objeto."""
+        end = min(self.position + self.chunk_size, self.size) - 1
+        response = self.s3_client.get_object(
+            Bucket=self.bucket,
+            Key=self.key,
+            Range=f'bytes={self.position}-{end}',
+            IfMatch=self.etag,
+        )
+        data = response['Body'].read()
+        self.position += len(data)
+        return data
+
+    def read(self, size=-1):
+        """Retorna até size bytes, buscando novos blocos quando preciso."""
+        if size is None or size < 0:
+            size = self.size
+        while len(self.buffer) < size and self.position < self.size:
+            self.buffer += self.fetch_range()
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+def validate_env():
+    """Valida variáveis de ambiente obrigatórias."""
+    if not S3_BUCKET or not DB_HOST:
+        raise ValueError("Variáveis S3_BUCKET e RDS_HOST são obrigatórias")
+    if not SECRET_ARN and not os.getenv('DB_USER'):
+        raise ValueError("Defina RDS_SECRET_ARN ou DB_USER/DB_PASSWORD")
+
+
+def get_db_credentials(session):
+    """Retorna usuário e senha do banco (env ou Secrets Manager)."""
+    if os.getenv('DB_USER'):
+        return os.getenv('DB_USER'), os.getenv('DB_PASSWORD')
+    client = session.client('secretsmanager')
+    response = client.get_secret_value(SecretId=SECRET_ARN)
+    secret = json.loads(response['SecretString'])
+    return secret['username'], secret['password']
+
+
+def get_connect(user, password):
+    """Retorna a função que abre uma conexão com o banco."""
+    def connect():
+        return psycopg2.connect(
+            host=DB_HOST, port=DB_PORT, dbname=DB_NAME,
+            user=user, password=password,
+        )
+    return connect
+
+
+def quote_columns(columns):
+    """Retorna a lista de colunas entre aspas, separadas por vírgula."""
+    return ', '.join(f'"{column}"' for column in columns)
+
+
+def get_create_table_sql(table, config):
+    """Retorna o CREATE TABLE tipado, sem chaves nem índices."""
+    columns = ', '.join(
+        f'"{column}" {data_type}' for column, data_type in config['columns']
+    )
+    return f'CREATE TABLE {table} ({columns})'
+
+
+def get_index_sql(table, config):
+    """Retorna os comandos de chave primária e índices da tabela."""
+    commands = []
+    if config['primary_key']:
+        commands.append(
+            f'ALTER TABLE {table} ADD PRIMARY KEY '
+            f'({quote_columns(config["primary_key"])})'
+        )
+    for columns in config['indexes']:
+        name = f'{table}_{"_".join(columns).lower()}_idx'
+        commands.append(
+            f'CREATE INDEX {name} ON {table} ({quote_columns(columns)})'
+        )
+    return commands
+
+
+def get_schema_hash(table, config):
+    """Retorna o hash do DDL da tabela (colunas, chave e índices)."""
+    ddl = [get_create_table_sql(table, config)] + get_index_sql(table, config)
+    return hashlib.sha256('\n'.join(ddl).encode()).hexdigest()
+
+
+def get_source_manifest(head):
+    """Retorna o hash de conteúdo e as linhas do objeto S3.
+
+    Usa o SHA-256 gravado como metadado pelo upload_csvs_to_s3.py e, na
+    falta dele, o ETag.
+    """
+    metadata = head.get('Metadata', {})
+    rows = metadata.get('rows')
+    return {
+        'content_hash': metadata.get('sha256') or head['ETag'],
+        'rows': int(rows) if rows else None,
+    }
+
+
+def ensure_state_table(connect):
+    """Cria a tabela de controle da carga, se não existir."""
+    conn = connect()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f'CREATE SCHEMA IF NOT EXISTS {STATE_SCHEMA}')
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {STATE_TABLE} ('
+                'table_name text PRIMARY KEY, source_key text, '
+                'content_hash text, schema_hash text, rows bigint, '
+                'loaded_at timestamptz)'
+            )
+            # Tabelas de controle criadas antes do manifesto
+            for column in ('content_hash', 'schema_hash'):
+                cursor.execute(
+                    f'ALTER TABLE {STATE_TABLE} '
+                    f'ADD COLUMN IF NOT EXISTS {column} text'
+                )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def get_load_states(connect):
+    """Retorna (content_hash, schema_hash) das tabelas já carregadas."""
+    conn = connect()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f'SELECT table_name, content_hash, schema_hash '
+                f'FROM {STATE_TABLE} '
+                'WHERE to_regclass(table_name) IS NOT NULL'
+            )
+            return {
+                table: (content_hash, schema_hash)
+                for table, content_hash, schema_hash in cursor.fetchall()
+            }
+    finally:
+        conn.close()
+
+
+def save_load_state(cursor, table, key, manifest, schema_hash, rows):
+    """Grava o manifesto da carga na tabela de controle."""
+    cursor.execute(
+        f'INSERT INTO {STATE_TABLE} (table_name, source_key, content_hash, '
+        'schema_hash, rows, loaded_at) VALUES (%s, %s, %s, %s, %s, now()) '
+        'ON CONFLICT (table_name) DO UPDATE SET '
+        'source_key = EXCLUDED.source_key, '
+        'content_hash = EXCLUDED.content_hash, '
+        'schema_hash = EXCLUDED.schema_hash, rows = EXCLUDED.rows, '
+        'loaded_at = EXCLUDED.loaded_at',
+        (table, key, manifest['content_hash'], schema_hash, rows),
+    )
+
+
+def get_diff_sql(table, staging, config):
+    """Retorna o upsert das linhas alteradas e o delete das removidas."""
+    columns = [column for column, _ in config['columns']]
+    key = config['primary_key']
+    values = [column for column in columns if column not in key]
+    if values:
+        action = (
+            'DO UPDATE SET '
+            + ', '.join(f'"{c}" = EXCLUDED."{c}"' for c in values)
+            + ' WHERE ROW('
+            + ', '.join(f'{table}."{c}"' for c in values)
+            + ') IS DISTINCT FROM ROW('
+            + ', '.join(f'EXCLUDED."{c}"' for c in values)
+            + ')'
+        )
+    else:
+        action = 'DO NOTHING'
+    upsert = (
+        f'INSERT INTO {table} ({quote_columns(columns)}) '
+        f'SELECT {quote_columns(columns)} FROM {staging} '
+        f'ON CONFLICT ({quote_columns(key)}) {action}'
+    )
+    delete = (
+        f'DELETE FROM {table} t WHERE NOT EXISTS ('
+        f'SELECT 1 FROM {staging} s WHERE '
+        + ' AND '.join(f's."{c}" = t."{c}"' for c in key)
+        + ')'
+    )
+    return upsert, delete
+
+
+def copy_from_reader(cursor, reader, table, config):
+    """Envia o objeto S3 em streaming para COPY ... FROM STDIN."""
+    cursor.copy_expert(
+        f'COPY {table} '
+        f'({quote_columns(c for c, _ in config["columns"])}) '
+        f'FROM STDIN WITH (FORMAT csv, HEADER true)',
+        reader,
+        size=RANGE_CHUNK_SIZE,
+    )
+    return cursor.rowcount
+
+
+def full_load(cursor, reader, table, config):
+    """Recria a tabela e carrega o objeto inteiro."""
+    cursor.execute(f'DROP TABLE IF EXISTS {table}')
+    cursor.execute(get_create_table_sql(table, config))
+    rows = copy_from_reader(cursor, reader, table, config)
+    for command in get_index_sql(table, config):
+        cursor.execute(command)
+    return rows, f"{rows:,} rows"
+
+
+def diff_load(cursor, reader, table, config):
+    """Carrega o objeto em uma tabela temporária e aplica só a diferença."""
+    staging = f'{table}_staging'
+    cursor.execute(
+        f'CREATE TEMP TABLE {staging} (LIKE {table}) ON COMMIT DROP'
+    )
+    rows = copy_from_reader(cursor, reader, staging, config)
+    cursor.execute(f'ANALYZE {staging}')
+    upsert, delete = get_diff_sql(table, staging, config)
+    cursor.execute(upsert)
+    upserted = cursor.rowcount
+    cursor.execute(delete)
+    deleted = cursor.rowcount
+    return rows, (
+        f"{rows:,} rows read, {upserted:,} upserted, {deleted:,} deleted"
+    )
+
+
+def load_table(connect, s3_client, bucket, prefix, table, incremental):
+    """Carrega uma tabela a partir do CSV no S3 e retorna o relatório.
+
+    Com incremental, o CSV vai para uma tabela temporária e só a diferença
+    é aplicada; caso contrário, a tabela é recriada. Tudo em uma única
+    transação, junto com o manifesto da carga.
+    """
+    config = TABLES[table]
+    key = f'{prefix}/{table}.csv'
+    reader = S3RangeReader(s3_client, bucket, key, RANGE_CHUNK_SIZE)
+    manifest = get_source_manifest(reader.head)
+    print(f"Processing {table} (s3://{bucket}/{key}, {reader.size:,} bytes)")
+    start = time.time()
+
+    conn = connect()
+    try:
+        with conn.cursor() as cursor:
+            load = diff_load if incremental else full_load
+            rows, summary = load(cursor, reader, table, config)
+            if manifest['rows'] is not None and rows != manifest['rows']:
+                raise ValueError(
+                    f"{key}: {rows:,} linhas lidas, {manifest['rows']:,} "
+                    "no manifesto"
+                )
+            save_load_state(
+                cursor, table, key, manifest,
+                get_schema_hash(table, config), rows
+            )
+        conn.commit()
+
+        with conn.cursor() as cursor:
+            cursor.execute(f'ANALYZE {table}')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    duration = time.time() - start
+    rows_per_second = rows / max(duration, 1e-6)
+    print(
+        f"Table {table} loaded successfully! ({summary}, "
+        f"{duration:.1f}s, {rows_per_second:,.0f} rows/s)"
+    )
+    return {"table": table, "rows": rows, "duration_seconds": duration}
+
+
+def run_load(connect, s3_client, bucket, prefix, table, incremental):
+    """Carrega uma tabela, devolvendo o erro em vez de propagá-lo."""
+    try:
+        return load_table(
+            connect, s3_client, bucket, prefix, table, incremental
+        )
+    except Exception as e:
+        print(f"Erro ao carregar {table}: {e}")
+        return {"table": table, "error": str(e)}
+
+
+def load_tables(connect, s3_client, bucket, prefix, tables,
+                force_reload=False, max_parallel=MAX_PARALLEL_LOADS):
+    """Carrega as tabelas em paralelo, ignorando as inalteradas.
+
+    Tabelas já carregadas com o mesmo DDL recebem só a diferença do CSV.
+    """
+    ensure_state_table(connect)
+    states = {} if force_reload else get_load_states(connect)
+
+    pending = []
+    for table in tables:
+        key = f'{prefix}/{table}.csv'
+        head = s3_client.head_object(Bucket=bucket, Key=key)
+        content_hash = get_source_manifest(head)['content_hash']
+        schema_hash = get_schema_hash(table, TABLES[table])
+        state = states.get(table)
+        if state == (content_hash, schema_hash):
+            print(f"Table {table} unchanged, skipping")
+        else:
+            incremental = state is not None and state[1] == schema_hash
+            pending.append((table, incremental))
+
+    if not pending:
+        return []
+    max_workers = max(1, min(max_parallel, len(pending)))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(
+            lambda item: run_load(
+                connect, s3_client, bucket, prefix, item[0], item[1]
+            ),
+            pending
+        ))
+
+
+def main():
+    """Função principal da migração."""
+    validate_env()
+
+    session = boto3.Session(region_name=AWS_REGION)
+    s3_client = session.client('s3', endpoint_url=S3_ENDPOINT_URL)
+    connect = get_connect(*get_db_credentials(session))
+
+    tables = [table.strip() for table in LOAD_TABLES.split(',')]
+    unknown = [table for table in tables if table not in TABLES]
+    if unknown:
+        raise ValueError(f"Tabelas desconhecidas: {unknown}")
+
+    results = load_tables(
+        connect, s3_client, S3_BUCKET, S3_PREFIX, tables, FORCE_RELOAD
+    )
+    errors = [result for result in results if "error" in result]
+    if errors:
+        raise RuntimeError(
+            f"Falha ao carregar: {[error['table'] for error in errors]}. "
+            "Reexecute para retomar as tabelas pendentes."
+        )
+    print("All tables created successfully!")
+
+
+if __name__ == "__main__":
+    main()
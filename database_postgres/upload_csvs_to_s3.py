@@ -2,58 +2,377 @@
 """
 Script para fazer upload dos CSVs do MovieLens para o S3.
 
+Os arquivos são enviados em paralelo, com multipart (tamanho de parte e
+concorrência configuráveis) e checksum SHA-256 por parte verificado pelo
+S3. Após cada upload, o tamanho e os metadados do objeto são conferidos.
+
+Cada upload grava o SHA-256 e o número de linhas do CSV como metadados do
+objeto (x-amz-meta-sha256 / x-amz-meta-rows), junto com o formato e, no
+Parquet, a compressão, o tamanho do row group e um hash dos tipos.
+Arquivos cujo hash e configuração de conversão já estão no S3 não são
+reenviados, o que evita recargas no RDS, no DMS e nos jobs
+Glue. O manifesto local (movielens_manifest.json) guarda o hash de cada
+arquivo por tamanho e data de modificação, para não recalculá-lo.
+
+Com UPLOAD_FORMAT=parquet, cada CSV é convertido em streaming (pyarrow)
+para Parquet tipado e comprimido, em row groups, e enviado como
+<tabela>.parquet. A migração para o RDS (s3_to_postgres.py) continua
+lendo os CSVs, então use o formato padrão para ela.
+
 Usage:
     export S3_BUCKET=your-bucket-name
     python3 upload_csvs_to_s3.py
+
+Variáveis opcionais:
+    FORCE_UPLOAD: true reenvia todos os arquivos
+    UPLOAD_FORMAT: csv (padrão) ou parquet
+    PARQUET_COMPRESSION: codec do Parquet (padrão: zstd)
+    PARQUET_ROW_GROUP_SIZE: linhas por row group (padrão: 1000000)
+    MULTIPART_CHUNK_MB: tamanho de cada parte do multipart (padrão: 16)
+    MAX_CONCURRENCY: partes enviadas em paralelo por arquivo (padrão: 10)
+    MAX_PARALLEL_UPLOADS: arquivos enviados em paralelo (padrão: 4)
+    S3_ENDPOINT_URL: endpoint S3 alternativo (ex.: moto_server, MinIO)
 """
+import hashlib
+import json
 import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
 
 # Configurações via variáveis de ambiente
 S3_BUCKET = os.getenv('S3_BUCKET')
 S3_PREFIX = os.getenv('S3_PREFIX', 'movielens-source-data')
+S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL')
 CSV_DIR = "ml-latest-small"
 REGION = os.getenv('AWS_REGION', 'us-east-1')
+FORCE_UPLOAD = os.getenv('FORCE_UPLOAD', 'false').lower() == 'true'
+UPLOAD_FORMAT = os.getenv('UPLOAD_FORMAT', 'csv')
+PARQUET_COMPRESSION = os.getenv('PARQUET_COMPRESSION', 'zstd')
+PARQUET_ROW_GROUP_SIZE = int(os.getenv('PARQUET_ROW_GROUP_SIZE', 1000000))
+MULTIPART_CHUNK_MB = int(os.getenv('MULTIPART_CHUNK_MB', 16))
+MAX_CONCURRENCY = int(os.getenv('MAX_CONCURRENCY', 10))
+MAX_PARALLEL_UPLOADS = int(os.getenv('MAX_PARALLEL_UPLOADS', 4))
+MANIFEST_PATH = Path(__file__).resolve().parent / 'movielens_manifest.json'
+HASH_CHUNK_SIZE = 1024 * 1024
 
 FILES = ["movies.csv", "ratings.csv", "tags.csv", "links.csv"]
 
+# Tipos das colunas no Parquet (os mesmos das tabelas no PostgreSQL);
+# imdbId é texto para preservar os zeros à esquerda.
+PARQUET_TYPES = {
+    "movies.csv": {
+        "movieId": "int32", "title": "string", "genres": "string",
+    },
+    "ratings.csv": {
+        "userId": "int32", "movieId": "int32", "rating": "float32",
+        "timestamp": "int64",
+    },
+    "tags.csv": {
+        "userId": "int32", "movieId": "int32", "tag": "string",
+        "timestamp": "int64",
+    },
+    "links.csv": {
+        "movieId": "int32", "imdbId": "string", "tmdbId": "int32",
+    },
+}
+
 
 def validate_env():
     """Valida variáveis de ambiente obrigatórias."""
     if not S3_BUCKET:
         raise ValueError("Variável S3_BUCKET não definida")
+    if UPLOAD_FORMAT not in ('csv', 'parquet'):
+        raise ValueError(f"UPLOAD_FORMAT inválido: {UPLOAD_FORMAT}")
+
+
+def get_transfer_config():
+    """Retorna a configuração de multipart do upload."""
+    chunk_size = MULTIPART_CHUNK_MB * 1024 * 1024
+    return TransferConfig(
+        multipart_threshold=chunk_size,
+        multipart_chunksize=chunk_size,
+        max_concurrency=MAX_CONCURRENCY,
+        use_threads=True,
+    )
+
+
+def load_manifest():
+    """Lê o manifesto local, se existir."""
+    if MANIFEST_PATH.exists():
+        return json.loads(MANIFEST_PATH.read_text())
+    return {}
+
+
+def save_manifest(manifest):
+    """Grava o manifesto local."""
+    MANIFEST_PATH.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+
+
+def compute_file_manifest(local_path):
+    """Calcula o SHA-256, o tamanho e as linhas de dados do CSV."""
+    sha256 = hashlib.sha256()
+    size = 0
+    newlines = 0
+    last = b'\n'
+    with open(local_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            sha256.update(chunk)
+            size += len(chunk)
+            newlines += chunk.count(b'\n')
+            last = chunk[-1:]
+    lines = newlines + (0 if last == b'\n' else 1)
+    return {
+        'sha256': sha256.hexdigest(),
+        'size': size,
+        'rows': max(lines - 1, 0),
+    }
+
+
+def get_file_manifest(local_path, manifest):
+    """Retorna o manifesto do arquivo, recalculando só se ele mudou."""
+    stat = local_path.stat()
+    entry = manifest.get(local_path.name)
+    if (
+        entry
+        and entry['size'] == stat.st_size
+        and entry['mtime_ns'] == stat.st_mtime_ns
+    ):
+        return entry
+    entry = compute_file_manifest(local_path)
+    entry['mtime_ns'] = stat.st_mtime_ns
+    manifest[local_path.name] = entry
+    return entry
+
+
+def get_upload_settings(file):
+    """Retorna a configuração de conversão gravada nos metadados do objeto.
+
+    Faz parte da verificação de arquivo inalterado: mudar o formato, a
+    compressão, o row group ou os tipos do Parquet força um novo envio.
+    """
+    if UPLOAD_FORMAT != 'parquet':
+        return {'format': UPLOAD_FORMAT}
+    types_hash = hashlib.sha256(
+        json.dumps(PARQUET_TYPES[file], sort_keys=True).encode()
+    ).hexdigest()[:16]
+    return {
+        'format': UPLOAD_FORMAT,
+        'compression': PARQUET_COMPRESSION,
+        'row-group-size': str(PARQUET_ROW_GROUP_SIZE),
+        'types-hash': types_hash,
+    }
+
+
+def get_remote_metadata(s3_client, s3_key):
+    """Retorna os metadados do objeto S3 (None se não existir)."""
+    try:
+        head = s3_client.head_object(Bucket=S3_BUCKET, Key=s3_key)
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise
+    return head
+
+
+def convert_csv_to_parquet(local_path, parquet_path):
+    """Converte o CSV em Parquet tipado, em streaming por blocos."""
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pv
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError(
+            "UPLOAD_FORMAT=parquet requer pyarrow (pip install pyarrow)"
+        ) from e
+
+    column_types = {
+        column: pa.type_for_alias(data_type)
+        for column, data_type in PARQUET_TYPES[local_path.name].items()
+    }
+    reader = pv.open_csv(
+        str(local_path),
+        read_options=pv.ReadOptions(block_size=HASH_CHUNK_SIZE * 16),
+        convert_options=pv.ConvertOptions(column_types=column_types),
+    )
+    rows = 0
+    batches = []
+    with pq.ParquetWriter(
+        str(parquet_path), reader.schema, compression=PARQUET_COMPRESSION
+    ) as writer:
+        # Acumula blocos até completar um row group, limitando a memória
+        # ao tamanho do row group
+        for batch in reader:
+            batches.append(batch)
+            rows += batch.num_rows
+            if sum(b.num_rows for b in batches) >= PARQUET_ROW_GROUP_SIZE:
+                writer.write_table(
+                    pa.Table.from_batches(batches),
+                    row_group_size=PARQUET_ROW_GROUP_SIZE,
+                )
+                batches = []
+        if batches:
+            writer.write_table(
+                pa.Table.from_batches(batches),
+                row_group_size=PARQUET_ROW_GROUP_SIZE,
+            )
+    return rows
+
+
+def verify_upload(s3_client, s3_key, upload_path, metadata):
+    """Confere tamanho e metadados do objeto enviado."""
+    head = get_remote_metadata(s3_client, s3_key)
+    if head is None:
+        raise RuntimeError(f"Objeto não encontrado após upload: {s3_key}")
+    if head['ContentLength'] != upload_path.stat().st_size:
+        raise RuntimeError(
+            f"Tamanho divergente em {s3_key}: {head['ContentLength']} "
+            f"no S3, {upload_path.stat().st_size} local"
+        )
+    if head.get('Metadata', {}).get('sha256') != metadata['sha256']:
+        raise RuntimeError(f"Metadado sha256 divergente em {s3_key}")
+
+
+def upload_file(s3_client, transfer_config, local_path, entry):
+    """Envia um arquivo (CSV ou Parquet) e retorna o relatório."""
+    start = time.time()
+    metadata = {
+        'sha256': entry['sha256'],
+        'rows': str(entry['rows']),
+        **get_upload_settings(local_path.name),
+    }
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if UPLOAD_FORMAT == 'parquet':
+            upload_path = Path(tmp_dir) / f"{local_path.stem}.parquet"
+            rows = convert_csv_to_parquet(local_path, upload_path)
+            if rows != entry['rows']:
+                raise RuntimeError(
+                    f"{local_path.name}: {rows:,} linhas convertidas, "
+                    f"{entry['rows']:,} no manifesto"
+                )
+        else:
+            upload_path = local_path
+        s3_key = f"{S3_PREFIX}/{upload_path.name}"
+
+        s3_client.upload_file(
+            str(upload_path), S3_BUCKET, s3_key,
+            ExtraArgs={'Metadata': metadata, 'ChecksumAlgorithm': 'SHA256'},
+            Config=transfer_config,
+        )
+        verify_upload(s3_client, s3_key, upload_path, metadata)
+        uploaded_bytes = upload_path.stat().st_size
+
+    duration = time.time() - start
+    return {
+        'file': local_path.name,
+        's3_key': s3_key,
+        'source_bytes': entry['size'],
+        'uploaded_bytes': uploaded_bytes,
+        'duration_seconds': duration,
+    }
+
+
+def is_uploaded(head, entry, settings):
+    """Indica se o objeto S3 tem o mesmo conteúdo e a mesma conversão."""
+    if head is None:
+        return False
+    remote = head.get('Metadata', {})
+    return remote.get('sha256') == entry['sha256'] and all(
+        remote.get(key) == value for key, value in settings.items()
+    )
+
+
+def process_file(s3_client, transfer_config, file, manifest):
+    """Envia um arquivo se ele mudou, devolvendo o resultado.
+
+    Erros (inclusive na consulta ao S3) ficam no resultado do arquivo, para
+    que os demais uploads e o manifesto local não sejam perdidos.
+    """
+    local_path = Path(CSV_DIR) / file
+    if not local_path.exists():
+        return {
+            'file': file,
+            'error': f"Arquivo não encontrado: {local_path}",
+        }
+
+    try:
+        entry = get_file_manifest(local_path, manifest)
+        extension = 'parquet' if UPLOAD_FORMAT == 'parquet' else 'csv'
+        s3_key = f"{S3_PREFIX}/{local_path.stem}.{extension}"
+        head = (
+            None if FORCE_UPLOAD else get_remote_metadata(s3_client, s3_key)
+        )
+        if is_uploaded(head, entry, get_upload_settings(file)):
+            return {'file': file, 'skipped': True}
+        return upload_file(s3_client, transfer_config, local_path, entry)
+    except Exception as e:
+        return {'file': file, 'error': str(e)}
+
+
+def print_result(result):
+    """Imprime o resultado do upload de um arquivo."""
+    file = result['file']
+    if 'error' in result:
+        print(f"❌ Erro ao fazer upload de {file}: {result['error']}")
+    elif result.get('skipped'):
+        print(f"⏭️  {file} inalterado, ignorando")
+    else:
+        mb = result['uploaded_bytes'] / (1024 * 1024)
+        duration = max(result['duration_seconds'], 1e-6)
+        ratio = result['uploaded_bytes'] / max(result['source_bytes'], 1)
+        print(
+            f"✅ {file} → {result['s3_key']} ({mb:,.1f} MB, "
+            f"{ratio:.0%} do CSV, {duration:.1f}s, "
+            f"{mb / duration:,.1f} MB/s)"
+        )
 
 
 def upload_files():
     """Faz upload dos arquivos CSV para o S3."""
     validate_env()
 
-    s3_client = boto3.client('s3', region_name=REGION)
+    # Uma conexão por parte em voo: arquivos em paralelo × partes por
+    # arquivo (o padrão do botocore, 10, serializaria as partes)
+    s3_client = boto3.client(
+        's3', region_name=REGION, endpoint_url=S3_ENDPOINT_URL,
+        config=Config(
+            max_pool_connections=MAX_PARALLEL_UPLOADS * MAX_CONCURRENCY
+        ),
+    )
+    transfer_config = get_transfer_config()
+    manifest = load_manifest()
 
     print("=== Upload dos CSVs do MovieLens para o S3 ===")
     print(f"Bucket: {S3_BUCKET}")
     print(f"Prefix: {S3_PREFIX}")
+    print(f"Formato: {UPLOAD_FORMAT}")
     print()
 
+    # Manifestos calculados antes, para as threads não alterarem o dict
     for file in FILES:
-        local_path = Path(CSV_DIR) / file
-        s3_key = f"{S3_PREFIX}/{file}"
-
-        if not local_path.exists():
-            print(f"❌ Arquivo não encontrado: {local_path}")
-            continue
+        if (Path(CSV_DIR) / file).exists():
+            get_file_manifest(Path(CSV_DIR) / file, manifest)
 
-        print(f"Uploading {file}...")
-        try:
-            s3_client.upload_file(str(local_path), S3_BUCKET, s3_key)
-            print(f"✅ {file} uploaded successfully")
-        except Exception as e:
-            print(f"❌ Erro ao fazer upload de {file}: {e}")
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL_UPLOADS) as executor:
+        results = list(executor.map(
+            lambda file: process_file(
+                s3_client, transfer_config, file, manifest
+            ),
+            FILES
+        ))
+    for result in results:
+        print_result(result)
 
+    save_manifest(manifest)
     print()
-    print("✅ Upload concluído!")
+    print(f"✅ Upload concluído em {time.time() - start:.1f}s!")
     print(f"Arquivos disponíveis em: s3://{S3_BUCKET}/{S3_PREFIX}/")
 
 
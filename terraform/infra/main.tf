@@ -64,6 +64,7 @@ module "dms" {
   dms_subnet_ids             = module.vpc_public.private_subnet_ids
   
   enable_ssl                 = false
+  replication_type           = "full-load"  # "full-load-and-cdc" + --merge_mode cdc nos jobs raw→staged
 
   vpc_id = module.vpc_public.vpc_id
 }
@@ -143,21 +144,24 @@ module "glue_jobs_etl" {
   
   job_scripts = {
     "datahandson-mds-raw-staged-deltalake" = "datahandson-mds-raw-staged-deltalake.py",
-    "datahandson-mds-staged-curated-deltalake-user-tags" = "datahandson-mds-staged-curated-deltalake-user-tags.py",
-    "datahandson-mds-staged-curated-deltalake-movie-ratings" = "datahandson-mds-staged-curated-deltalake-movie-ratings.py"
+    "datahandson-mds-staged-curated-deltalake" = "datahandson-mds-staged-curated-deltalake.py",
+    "datahandson-mds-deltalake-maintenance" = "datahandson-mds-deltalake-maintenance.py"
   }
+
+  # Motor de Data Quality usado na auditoria (write-audit-publish) do curated
+  extra_py_scripts = ["datahandson_mds_dq_engine.py"]
   
   worker_type       = "G.1X"
   number_of_workers = 3
   timeout           = 60
   max_retries       = 1
-  max_concurrent_runs = 4  # Permite 4 execuções paralelas do mesmo job
+  max_concurrent_runs = 4  # Permite 4 execuções paralelas do mesmo job (ou --table_manifest em uma única execução)
   
   additional_python_modules = "delta-spark==3.2.1"
   
   additional_arguments = {
     "--enable-glue-datacatalog" = "true"
-    "--conf"                    = "spark.sql.extensions=io.delta.sql.DeltaSparkSessionExtension --conf spark.sql.catalog.spark_catalog=org.apache.spark.sql.delta.catalog.DeltaCatalog --conf spark.delta.logStore.class=org.apache.spark.sql.delta.storage.S3SingleDriverLogStore"
+    "--conf"                    = "spark.sql.extensions=io.delta.sql.DeltaSparkSessionExtension --conf spark.sql.catalog.spark_catalog=org.apache.spark.sql.delta.catalog.DeltaCatalog --conf spark.delta.logStore.class=org.apache.spark.sql.delta.storage.S3SingleDriverLogStore --conf spark.scheduler.mode=FAIR"
     "--datalake-formats"        = "delta"
   }
 }
@@ -179,7 +183,11 @@ module "glue_crawler_delta" {
   delta_tables = [
     # Apenas CURATED (Gold Layer) - Dados prontos para consumo
     "s3://${var.s3_bucket_curated}/movielens_delta_glue/movie_ratings/",
-    "s3://${var.s3_bucket_curated}/movielens_delta_glue/user_tags/"
+    "s3://${var.s3_bucket_curated}/movielens_delta_glue/movie_genres/",
+    "s3://${var.s3_bucket_curated}/movielens_delta_glue/genre_year_ratings/",
+    "s3://${var.s3_bucket_curated}/movielens_delta_glue/user_tags/",
+    "s3://${var.s3_bucket_curated}/movielens_delta_glue/dq_metrics_history/",
+    "s3://${var.s3_bucket_curated}/movielens_delta_glue/dq_validation_results/"
   ]
 
   # Opcional: configurar um agendamento para o crawler
@@ -232,17 +240,23 @@ module "glue_jobs_dq" {
   job_scripts = {
     "datahandson-mds-deltalake-data-quality" = "datahandson-mds-deltalake-data-quality.py"
   }
+
+  extra_py_scripts = [
+    "datahandson_mds_dq_engine.py",
+    "datahandson_mds_dq_report.py"
+  ]
   
   worker_type       = "G.1X"
   number_of_workers = 3
   timeout           = 60
   max_retries       = 1
   
-  additional_python_modules = "great_expectations[spark]==0.16.5,delta-spark==3.2.1"
+  # great_expectations[spark]==0.16.5 só é necessário com --docs_mode ge
+  additional_python_modules = "delta-spark==3.2.1"
   
   additional_arguments = {
     "--enable-glue-datacatalog" = "true"
-    "--conf"                    = "spark.sql.extensions=io.delta.sql.DeltaSparkSessionExtension --conf spark.sql.catalog.spark_catalog=org.apache.spark.sql.delta.catalog.DeltaCatalog --conf spark.delta.logStore.class=org.apache.spark.sql.delta.storage.S3SingleDriverLogStore"
+    "--conf"                    = "spark.sql.extensions=io.delta.sql.DeltaSparkSessionExtension --conf spark.sql.catalog.spark_catalog=org.apache.spark.sql.delta.catalog.DeltaCatalog --conf spark.delta.logStore.class=org.apache.spark.sql.delta.storage.S3SingleDriverLogStore --conf spark.scheduler.mode=FAIR"
     "--datalake-formats"        = "delta"
   }
 }
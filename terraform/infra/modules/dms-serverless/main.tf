@@ -32,7 +32,7 @@ resource "aws_dms_replication_config" "this" {
   replication_config_identifier = "${var.project_name}-dms-serverless"
   source_endpoint_arn           = aws_dms_endpoint.postgres_source.endpoint_arn
   target_endpoint_arn           = aws_dms_s3_endpoint.s3_target.endpoint_arn
-  replication_type              = "full-load"
+  replication_type              = var.replication_type
   start_replication             = false  # NÃO iniciar automaticamente
   
   # Configuração simplificada para evitar problemas com TimestampColumnName
@@ -140,5 +140,8 @@ resource "aws_dms_s3_endpoint" "s3_target" {
   parquet_version         = "parquet-1-0"
   service_access_role_arn = aws_iam_role.dms_s3_access.arn
   timestamp_column_name   = "dms_timestamp_col"
+
+  # Coluna Op (I/U/D) também no full-load para o merge CDC do job raw→staged
+  include_op_for_full_load = var.replication_type != "full-load"
 }
 
@@ -60,6 +60,12 @@ variable "enable_ssl" {
   description = "Habilitar conexão SSL com o RDS PostgreSQL"
 }
 
+variable "replication_type" {
+  type        = string
+  default     = "full-load"
+  description = "Tipo de replicação do DMS (full-load, cdc, full-load-and-cdc). CDC exige rds.logical_replication habilitado no RDS"
+}
+
 variable "log_retention_days" {
   description = "Número de dias para reter os logs do CloudWatch"
   type        = number
@@ -88,6 +88,22 @@ resource "aws_s3_object" "glue_script" {
   etag   = filemd5("${var.scripts_local_path}/${each.value}")
 }
 
+resource "aws_s3_object" "glue_extra_py_script" {
+  for_each = toset(var.extra_py_scripts)
+
+  bucket = var.s3_bucket_scripts
+  key    = "glue_jobs_scripts/${var.project_name}/lib/${each.value}"
+  source = "${var.scripts_local_path}/${each.value}"
+  etag   = filemd5("${var.scripts_local_path}/${each.value}")
+}
+
+locals {
+  extra_py_files = join(",", compact(concat(
+    [var.extra_py_files],
+    [for script in var.extra_py_scripts : "s3://${var.s3_bucket_scripts}/glue_jobs_scripts/${var.project_name}/lib/${script}"]
+  )))
+}
+
 resource "aws_glue_job" "glue_job" {
   for_each = var.job_scripts
 
@@ -115,7 +131,7 @@ resource "aws_glue_job" "glue_job" {
     "--TempDir"                       = "s3://${var.s3_bucket_scripts}/glue_jobs_temp/"
     "--enable-auto-scaling"           = "true"
     "--conf"                          = "spark.sql.legacy.timeParserPolicy=LEGACY"
-    "--extra-py-files"                = var.extra_py_files
+    "--extra-py-files"                = local.extra_py_files
     "--additional-python-modules"     = var.additional_python_modules
     "--extra-jars"                    = var.extra_jars != "" ? var.extra_jars : null
   }, var.additional_arguments)
@@ -78,6 +78,12 @@ variable "extra_py_files" {
   default     = ""
 }
 
+variable "extra_py_scripts" {
+  description = "Módulos Python locais (em scripts_local_path) enviados ao S3 e adicionados ao --extra-py-files"
+  type        = list(string)
+  default     = []
+}
+
 variable "extra_jars" {
   description = "Arquivos JAR extras para incluir no job (caminho S3)"
   type        = string
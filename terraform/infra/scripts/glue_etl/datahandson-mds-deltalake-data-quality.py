@@ -1,47 +1,383 @@
 """
-Glue Job: Data Quality com Great Expectations.
+Glue Job: Data Quality das tabelas curated Delta Lake.
 
-Este job executa validações de qualidade de dados nas tabelas
-curated Delta Lake usando Great Expectations.
+As suites são validadas pelo motor nativo (datahandson_mds_dq_engine), que
+compila as expectativas de cada tabela em uma única agregação Spark. O
+resultado é gravado no formato de validação do Great Expectations (JSON) e
+publicado no relatório de Data Quality.
 
 Configurações Glue:
 --conf spark.sql.extensions=io.delta.sql.DeltaSparkSessionExtension
 --conf spark.sql.catalog.spark_catalog=org.apache.spark.sql.delta.catalog.DeltaCatalog
 --datalake-formats delta
---additional-python-modules great_expectations[spark]==0.16.5,delta-spark==3.2.1
+--additional-python-modules delta-spark==3.2.1
+  (com --docs_mode ge, inclua great_expectations[spark]==0.16.5; o pacote
+  só é importado nesse modo)
+--extra-py-files s3://.../datahandson_mds_dq_engine.py,
+  s3://.../datahandson_mds_dq_report.py
+
+Parâmetros opcionais:
+--uniqueness_mode: exact (count distinct, padrão) ou approx
+--approx_distinct_rsd: erro relativo do distinct aproximado (0.01)
+--force_validation: true revalida mesmo com resultado em cache (false)
+--validation_mode: full (padrão), incremental ou sampled
+--sample_fraction: fração amostrada no modo sampled (derivada do erro alvo
+  quando vazia)
+--sample_target_error: erro absoluto alvo das taxas estimadas (0.005)
+--sample_confidence: nível de confiança dos intervalos (0.95)
+--sample_seed: semente da amostragem (42)
+--validations: pares tabela:suite separados por vírgula (movie_ratings e
+  user_tags com suas suites, por padrão)
+--max_parallel_validations: validações simultâneas (4)
+--docs_mode: report (relatório incremental, padrão), ge (Data Docs do
+  Great Expectations, reconstruídos a cada execução) ou none
+
+As colunas de partição das tabelas curated (ex.: movieid_bucket) não fazem
+parte das suites e são descartadas antes da validação, como na auditoria
+do job curated.
+
+O veredito de cada tabela fica em cache (dq_cache/ no bucket de Data Docs),
+chaveado pelo caminho da tabela, versão Delta e hash da suite; se nada
+mudou, o resultado em cache é reutilizado sem ler a tabela.
+
+No modo incremental, as métricas por linha (nulos, fora do intervalo,
+contagem) são atualizadas com o Change Data Feed desde a última versão
+validada, com sinal +1/-1 por alteração. A unicidade é mantida por um
+estado de contagem por chave (dq_state/), atualizado só nas chaves
+alteradas. Sem estado válido, CDF (inclusive arquivos já removidos pelo
+VACUUM) ou com min/max na suite, a tabela é lida por completo. Cada
+execução é registrada em dq_metrics_history.
+
+No modo sampled, as taxas por linha (nulos, fora do intervalo) são
+estimadas em uma amostra Bernoulli e reportadas com intervalos de Wilson
+em result.details.sampling; unicidade, min/max e expectativas com
+meta.exact continuam exatas, lendo apenas as colunas necessárias.
+
+Os pares tabela/suite são validados em paralelo (threads com pools do
+FAIR scheduler) na mesma SparkSession; o resultado final é a combinação
+de todos.
+
+No docs_mode report, os resultados por expectativa são anexados à tabela
+Delta dq_validation_results e só os artefatos da execução são escritos em
+dq_report/ (página da execução e index.html com as últimas execuções).
 """
+import json
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from math import sqrt
+from statistics import NormalDist
 
-import great_expectations as ge
 from awsglue.utils import getResolvedOptions
-from great_expectations.core.batch import RuntimeBatchRequest
-from great_expectations.core.yaml_handler import YAMLHandler
-from great_expectations.data_context.types.base import DataContextConfig
+from datahandson_mds_dq_engine import (
+    SUITE_NAME_MOVIES, SUITE_NAME_TAGS, SUITES, build_validation_result,
+    collect_metrics, compile_suite, compute_full_metrics, get_change_sign,
+    get_run_id, get_suite_hash, get_table_version, is_missing_file_error,
+    load_cache_entry, print_failed_expectations, save_cache_entry,
+    save_validation_result,
+)
+from datahandson_mds_dq_report import (
+    append_validation_results, publish_report,
+)
+from delta.tables import DeltaTable
+from py4j.protocol import Py4JJavaError
 from pyspark.sql import SparkSession
+from pyspark.sql.functions import coalesce, col, count, greatest, lit, when
+from pyspark.sql.functions import sum as spark_sum
+from pyspark.sql.utils import AnalysisException
+
+# Pares tabela:suite validados por padrão
+DEFAULT_VALIDATIONS = (
+    f'movie_ratings:{SUITE_NAME_MOVIES},user_tags:{SUITE_NAME_TAGS}'
+)
+
+OPTIONAL_ARGS = {
+    'validations': DEFAULT_VALIDATIONS,
+    'max_parallel_validations': '4',
+    'uniqueness_mode': 'exact',
+    'approx_distinct_rsd': '0.01',
+    'force_validation': 'false',
+    'validation_mode': 'full',
+    'sample_fraction': '',
+    'sample_target_error': '0.005',
+    'sample_confidence': '0.95',
+    'sample_seed': '42',
+    'docs_mode': 'report',
+}
+DOCS_MODES = ('report', 'ge', 'none')
+METRICS_HISTORY_SCHEMA = (
+    "run_name string, run_time string, table_name string, "
+    "suite_name string, delta_version bigint, start_version bigint, "
+    "validation_mode string, success boolean, "
+    "evaluated_expectations int, successful_expectations int, "
+    "element_count bigint, rows_read bigint, duration_seconds double, "
+    "metrics string, report_page boolean"
+)
+
+
+def get_args():
+    """Obtém argumentos do Glue Job."""
+    args = getResolvedOptions(sys.argv, ['curated_bucket', 'datadocs_bucket'])
+    for name, default in OPTIONAL_ARGS.items():
+        if f'--{name}' in sys.argv:
+            args[name] = getResolvedOptions(sys.argv, [name])[name]
+        else:
+            args[name] = default
+    return args
+
+
+###############################################################################
+# Validação incremental (Change Data Feed + estado agregado)
+###############################################################################
+def read_changes(spark, table_path, start_version, end_version):
+    """Lê as alterações (com sinal) da tabela entre duas versões."""
+    return (
+        spark.read.format("delta")
+        .option("readChangeFeed", "true")
+        .option("startingVersion", start_version)
+        .option("endingVersion", end_version)
+        .load(table_path)
+        .withColumn("_sign", get_change_sign())
+        .filter(col("_sign") != 0)
+    )
 
-yaml = YAMLHandler()
-
-DATASOURCE_YAML = """
-name: my_spark_datasource
-class_name: Datasource
-module_name: great_expectations.datasource
-execution_engine:
-    module_name: great_expectations.execution_engine
-    class_name: SparkDFExecutionEngine
-data_connectors:
-    my_runtime_data_connector:
-        class_name: RuntimeDataConnector
-        batch_identifiers:
-            - some_key_maybe_pipeline_stage
-            - some_other_key_maybe_airflow_run_id
-"""
 
-SUITE_NAME_MOVIES = 'suite_tests_movie_ratings'
-SUITE_NAME_TAGS = 'suite_tests_user_tags'
+def get_key_state_path(options, table, suite, column):
+    """Caminho do estado de contagem por chave (unicidade incremental)."""
+    return f"{options['state_path']}/{table}/{suite['suite_name']}/{column}/"
 
 
+def build_key_state(spark, df, state_path, column):
+    """Recria o estado de contagem por chave a partir da tabela completa."""
+    (
+        df.filter(col(column).isNotNull())
+        .groupBy(col(column).alias("key"))
+        .agg(count("*").alias("key_count"))
+        .write.format("delta")
+        .mode("overwrite")
+        .option("overwriteSchema", "true")
+        .save(state_path)
+    )
+    return get_table_version(spark, state_path)
+
+
+def apply_key_changes(spark, changes_df, state_path, column):
+    """Aplica alterações ao estado de chaves; retorna o delta de duplicatas.
+
+    Apenas as chaves alteradas são lidas e atualizadas; o delta é a
+    variação do excesso (contagem − 1) dessas chaves.
+    """
+    key_delta_df = (
+        changes_df.filter(col(column).isNotNull())
+        .groupBy(col(column).alias("key"))
+        .agg(spark_sum("_sign").alias("delta"))
+        .filter(col("delta") != 0)
+    )
+    state_table = DeltaTable.forPath(spark, state_path)
+    old_count = coalesce(col("key_count"), lit(0))
+    duplicate_delta = (
+        key_delta_df.join(state_table.toDF(), on="key", how="left")
+        .agg(coalesce(spark_sum(
+            greatest(old_count + col("delta") - 1, lit(0))
+            - greatest(old_count - 1, lit(0))
+        ), lit(0)).alias("duplicate_delta"))
+        .first()["duplicate_delta"]
+    )
+    (
+        state_table.alias("target")
+        .merge(key_delta_df.alias("source"), "target.key = source.key")
+        .whenMatchedDelete(
+            condition="target.key_count + source.delta <= 0"
+        )
+        .whenMatchedUpdate(
+            set={"key_count": "target.key_count + source.delta"}
+        )
+        .whenNotMatchedInsert(
+            values={"key": "source.key", "key_count": "source.delta"}
+        )
+        .execute()
+    )
+    return duplicate_delta, get_table_version(spark, state_path)
+
+
+def can_validate_incrementally(spark, compiled, cached, cache_key, options,
+                               table, suite):
+    """Indica se há estado válido para validar só as alterações."""
+    if cached is None or "metrics" not in cached:
+        return False
+    previous_key = cached["key"]
+    if (
+        previous_key["table_path"] != cache_key["table_path"]
+        or previous_key["suite_hash"] != cache_key["suite_hash"]
+        or previous_key["version"] >= cache_key["version"]
+    ):
+        return False
+
+    keys = collect_metrics(compiled, "keys")
+    if set(collect_metrics(compiled, "aggregates")) - set(keys):
+        # min/max não são mantidos sob deletes: exigem leitura completa
+        return False
+    state_versions = cached.get("state_versions", {})
+    for column in keys.values():
+        state_path = get_key_state_path(options, table, suite, column)
+        if (
+            not DeltaTable.isDeltaTable(spark, state_path)
+            or state_versions.get(column)
+            != get_table_version(spark, state_path)
+        ):
+            return False
+    return True
+
+
+def compute_incremental_metrics(spark, compiled, cached, cache_key, options,
+                                table, suite):
+    """Soma às métricas em cache as alterações desde a última validação.
+
+    Retorna as métricas, as versões do estado de chaves e as linhas lidas.
+    """
+    changes_df = read_changes(
+        spark, cache_key["table_path"],
+        cached["key"]["version"] + 1, cache_key["version"]
+    ).persist()
+    try:
+        counts = {"element_count": lit(True)}
+        counts.update(collect_metrics(compiled, "counts"))
+        delta = changes_df.agg(
+            count("*").alias("_rows_read"),
+            *[
+                coalesce(
+                    spark_sum(when(condition, col("_sign"))), lit(0)
+                ).alias(alias)
+                for alias, condition in counts.items()
+            ],
+        ).first().asDict()
+
+        metrics = dict(cached["metrics"])
+        for alias in counts:
+            metrics[alias] = metrics.get(alias, 0) + delta[alias]
+
+        state_versions = {}
+        for alias, column in collect_metrics(compiled, "keys").items():
+            duplicate_delta, state_versions[column] = apply_key_changes(
+                spark, changes_df,
+                get_key_state_path(options, table, suite, column), column
+            )
+            metrics[alias] = metrics.get(alias, 0) + duplicate_delta
+        return metrics, state_versions, delta["_rows_read"]
+    finally:
+        changes_df.unpersist()
+
+
+###############################################################################
+# Validação por amostragem
+###############################################################################
+def get_z_score(confidence):
+    """Quantil normal bicaudal para o nível de confiança."""
+    return NormalDist().inv_cdf((1 + confidence) / 2)
+
+
+def get_sample_fraction(options, element_count):
+    """Fração de amostragem configurada ou derivada do erro alvo.
+
+    Para o erro alvo e (absoluto, sobre a taxa) usa o pior caso p = 0.5:
+    n = z² / (4 · e²).
+    """
+    sampling = options["sampling"]
+    if sampling["fraction"]:
+        return min(sampling["fraction"], 1.0)
+    if not element_count:
+        return 1.0
+    z = get_z_score(sampling["confidence"])
+    sample_size = z ** 2 / (4 * sampling["target_error"] ** 2)
+    return min(sample_size / element_count, 1.0)
+
+
+def get_wilson_interval(successes, trials, z):
+    """Intervalo de Wilson para uma proporção binomial."""
+    if trials == 0:
+        return 0.0, 1.0
+    p = successes / trials
+    denominator = 1 + z ** 2 / trials
+    center = (p + z ** 2 / (2 * trials)) / denominator
+    margin = z * sqrt(
+        p * (1 - p) / trials + z ** 2 / (4 * trials ** 2)
+    ) / denominator
+    return max(center - margin, 0.0), min(center + margin, 1.0)
+
+
+def is_exact_expectation(expectation):
+    """Expectativas marcadas com meta.exact não são amostradas."""
+    return bool(expectation.get("meta", {}).get("exact"))
+
+
+def compute_sampled_metrics(df, compiled, options):
+    """Estima as métricas por linha em uma amostra da tabela.
+
+    Agregações (unicidade, min/max) e expectativas com meta.exact são
+    calculadas sobre a tabela completa, lendo apenas as colunas envolvidas.
+    Retorna as métricas, os detalhes da amostragem e as linhas amostradas.
+    """
+    exact_counts = {"element_count": lit(True)}
+    sampled_counts = {}
+    for expectation, compiled_expectation in compiled:
+        if compiled_expectation is None:
+            continue
+        if is_exact_expectation(expectation):
+            exact_counts.update(compiled_expectation["counts"])
+        else:
+            sampled_counts.update(compiled_expectation["counts"])
+    sampled_counts = {
+        alias: condition for alias, condition in sampled_counts.items()
+        if alias not in exact_counts
+    }
+
+    aggregates = collect_metrics(compiled, "aggregates")
+    metrics = df.agg(
+        *[
+            count(when(condition, 1)).alias(alias)
+            for alias, condition in exact_counts.items()
+        ],
+        *[metric.alias(alias) for alias, metric in aggregates.items()],
+    ).first().asDict()
+
+    element_count = metrics["element_count"]
+    fraction = get_sample_fraction(options, element_count)
+    sample_df = (
+        df if fraction >= 1.0
+        else df.sample(fraction=fraction, seed=options["sampling"]["seed"])
+    )
+    sample = sample_df.agg(
+        count("*").alias("_sample_size"),
+        *[
+            count(when(condition, 1)).alias(alias)
+            for alias, condition in sampled_counts.items()
+        ],
+    ).first().asDict()
+
+    sample_size = sample["_sample_size"]
+    z = get_z_score(options["sampling"]["confidence"])
+    bounds = {}
+    for alias in sampled_counts:
+        rate = sample[alias] / sample_size if sample_size else 0.0
+        low, high = get_wilson_interval(sample[alias], sample_size, z)
+        metrics[alias] = round(rate * element_count)
+        bounds[alias] = [low * 100, high * 100]
+
+    return metrics, {
+        "sample_fraction": fraction,
+        "sample_size": sample_size,
+        "confidence": options["sampling"]["confidence"],
+        "bounds": bounds,
+    }, sample_size
+
+
+###############################################################################
+# Persistência dos resultados e Data Docs
+###############################################################################
 def config_data_docs_site(context, output_path):
     """Configura site de Data Docs no S3."""
+    from great_expectations.data_context.types.base import DataContextConfig
+
     data_context_config = DataContextConfig()
 
     data_context_config["data_docs_sites"] = {
@@ -63,96 +399,332 @@ def config_data_docs_site(context, output_path):
 
 
 def create_context_ge(output_path):
-    """Cria contexto do Great Expectations."""
-    context = ge.get_context()
-    context.add_expectation_suite(expectation_suite_name=SUITE_NAME_MOVIES)
-    context.add_expectation_suite(expectation_suite_name=SUITE_NAME_TAGS)
+    """Cria contexto do Great Expectations com as suites registradas."""
+    import great_expectations as ge
+    from great_expectations.core import ExpectationConfiguration
 
-    context.add_datasource(**yaml.load(DATASOURCE_YAML))
+    context = ge.get_context()
+    for suite in SUITES.values():
+        context.add_expectation_suite(
+            expectation_suite_name=suite["suite_name"],
+            expectations=[
+                ExpectationConfiguration(**expectation)
+                for expectation in suite["expectations"]
+            ],
+        )
     config_data_docs_site(context, output_path)
-
     return context
 
 
-def create_validator(context, suite, df):
-    """Cria validator para o DataFrame."""
-    runtime_batch_request = RuntimeBatchRequest(
-        datasource_name="my_spark_datasource",
-        data_connector_name="my_runtime_data_connector",
-        data_asset_name="data_asset",
-        runtime_parameters={"batch_data": df},
-        batch_identifiers={
-            "some_key_maybe_pipeline_stage": "ingestion",
-            "some_other_key_maybe_airflow_run_id": "run_001",
-        },
-    )
-    return context.get_validator(
-        batch_request=runtime_batch_request,
-        expectation_suite=suite
-    )
-
-
-def add_tests_movie_ratings(df_validator):
-    """Adiciona testes de qualidade para movie_ratings."""
-    df_validator.expect_table_columns_to_match_ordered_list([
-        "movieid", "title", "genres", "avg_rating"
-    ])
-    df_validator.expect_column_values_to_be_unique("movieid")
-    df_validator.expect_column_values_to_not_be_null("movieid")
-    df_validator.expect_column_values_to_be_between(
-        "avg_rating",
-        min_value=0,
-        max_value=5
-    )
-    df_validator.save_expectation_suite(discard_failed_expectations=False)
-    return df_validator
-
-
-def add_tests_user_tags(df_validator):
-    """Adiciona testes de qualidade para user_tags."""
-    df_validator.expect_table_columns_to_match_ordered_list([
-        "userid", "tag", "tag_count"
-    ])
-    df_validator.expect_column_values_to_not_be_null("userid")
-    df_validator.expect_column_values_to_be_between(
-        "tag_count",
-        min_value=0,
-        max_value=1000
-    )
-    df_validator.save_expectation_suite(discard_failed_expectations=False)
-    return df_validator
-
-
-def process_suite_ge(spark, input_path, output_path):
-    """Processa suites de validação do Great Expectations."""
+def build_data_docs(output_path, runs):
+    """Gera os Data Docs a partir dos resultados da validação nativa.
+
+    O Great Expectations só é importado aqui (--docs_mode ge), para que as
+    demais execuções não dependam do pacote.
+    """
+    try:
+        from great_expectations.core.expectation_validation_result import (
+            ExpectationSuiteValidationResultSchema,
+        )
+        from great_expectations.core.run_identifier import RunIdentifier
+        from great_expectations.data_context.types import (
+            resource_identifiers,
+        )
+    except ImportError as e:
+        raise ImportError(
+            "--docs_mode ge requer great_expectations[spark]==0.16.5 em "
+            "--additional-python-modules"
+        ) from e
+
     context = create_context_ge(output_path)
+    schema = ExpectationSuiteValidationResultSchema()
+    for run in runs:
+        result = run["result"]
+        meta = result["meta"]
+        suite_identifier = resource_identifiers.ExpectationSuiteIdentifier(
+            meta["expectation_suite_name"]
+        )
+        identifier = resource_identifiers.ValidationResultIdentifier(
+            expectation_suite_identifier=suite_identifier,
+            run_id=RunIdentifier(
+                run_name=meta["run_id"]["run_name"],
+                run_time=meta["run_id"]["run_time"],
+            ),
+            batch_identifier=run["table"],
+        )
+        context.validations_store.set(identifier, schema.load(result))
+    context.build_data_docs(site_names=["s3_site"])
+
+
+def print_report(runs, errors):
+    """Imprime o resultado de cada validação e as expectativas com falha."""
+    for run in runs:
+        result = run["result"]
+        print(
+            f"{run['table']} ({run['suite_name']}): "
+            f"{'OK' if result['success'] else 'FALHOU'} - modo {run['mode']}, "
+            f"{run['rows_read']} linhas lidas ({run['duration_seconds']}s)"
+        )
+        print_failed_expectations(result)
+    for error in errors:
+        print(f"{error['table']} ({error['suite_name']}): ERRO")
+        print(f"  └─ {error['error']}")
+
+
+def drop_partition_columns(spark, table_path, df):
+    """Remove as colunas de partição (buckets de layout, fora das suites).
 
-    # Processando movie_ratings
-    df_movie = spark.read.format("delta").load(f'{input_path}/movie_ratings/')
-    suite_movies = context.get_expectation_suite(
-        expectation_suite_name=SUITE_NAME_MOVIES
+    A auditoria do job curated valida o DataFrame sem elas; assim os dois
+    jobs validam o mesmo schema com as mesmas suites.
+    """
+    partition_columns = (
+        DeltaTable.forPath(spark, table_path).detail()
+        .first()["partitionColumns"]
     )
-    df_validator_movies = create_validator(context, suite_movies, df_movie)
-    df_validator_movies = add_tests_movie_ratings(df_validator_movies)
-    results_movies = df_validator_movies.validate(expectation_suite=suite_movies)
+    return df.drop(*partition_columns) if partition_columns else df
+
+
+def validate_suite(spark, input_path, output_path, table, suite, options,
+                   run_id):
+    """Valida uma tabela e retorna o resultado com o modo utilizado.
+
+    Modos: cached (tabela inalterada), incremental (apenas as alterações
+    desde a última versão validada), sampled (amostra com intervalos de
+    confiança) ou full (leitura completa).
+    """
+    start = time.time()
+    table_path = f'{input_path}/{table}/'
+    version = get_table_version(spark, table_path)
+    cache_key = {
+        "table_path": table_path,
+        "version": version,
+        "suite_hash": get_suite_hash(suite, options),
+    }
+
+    cached = load_cache_entry(spark, output_path, table, suite)
+    if (
+        not options["force_validation"]
+        and cached is not None and cached["key"] == cache_key
+    ):
+        return build_validation_run(
+            table, suite, cached["result"], "cached", version, 0, start,
+            cached.get("metrics", {})
+        )
 
-    # Processando user_tags
-    df_tags = spark.read.format("delta").load(f'{input_path}/user_tags/')
-    suite_tags = context.get_expectation_suite(
-        expectation_suite_name=SUITE_NAME_TAGS
+    df = drop_partition_columns(spark, table_path, (
+        spark.read.format("delta")
+        .option("versionAsOf", version)
+        .load(table_path)
+    ))
+    compiled = compile_suite(suite, df.columns, options)
+    incremental = options["validation_mode"] == "incremental"
+
+    metrics, sampling = None, None
+    if options["validation_mode"] == "sampled":
+        metrics, sampling, rows_read = compute_sampled_metrics(
+            df, compiled, options
+        )
+        mode, start_version, state_versions = "sampled", 0, {}
+    elif incremental and can_validate_incrementally(
+            spark, compiled, cached, cache_key, options, table, suite):
+        try:
+            metrics, state_versions, rows_read = compute_incremental_metrics(
+                spark, compiled, cached, cache_key, options, table, suite
+            )
+            mode, start_version = "incremental", cached["key"]["version"] + 1
+        except (AnalysisException, Py4JJavaError) as e:
+            # Ex.: CDF desabilitado no intervalo, mudança de schema ou
+            # arquivos removidos pelo VACUUM (falha na primeira ação)
+            if isinstance(e, Py4JJavaError) and not is_missing_file_error(e):
+                raise
+            print(f"Validação incremental indisponível para {table}: {e}")
+
+    if metrics is None:
+        metrics = compute_full_metrics(df, compiled)
+        mode, start_version = "full", 0
+        rows_read = metrics["element_count"]
+        state_versions = {}
+        if incremental:
+            for column in collect_metrics(compiled, "keys").values():
+                state_versions[column] = build_key_state(
+                    spark, df,
+                    get_key_state_path(options, table, suite, column), column
+                )
+
+    result = build_validation_result(
+        table, table_path, version, suite, compiled, metrics, df.columns,
+        run_id, sampling
+    )
+    save_validation_result(spark, output_path, table, result)
+    save_cache_entry(spark, output_path, table, suite, {
+        "key": cache_key,
+        "result": result,
+        "metrics": metrics,
+        "state_versions": state_versions,
+    })
+    return build_validation_run(
+        table, suite, result, mode, start_version, rows_read, start, metrics
     )
-    df_validator_tags = create_validator(context, suite_tags, df_tags)
-    df_validator_tags = add_tests_user_tags(df_validator_tags)
-    results_tags = df_validator_tags.validate(expectation_suite=suite_tags)
 
-    if results_movies['success'] and results_tags['success']:
+
+def build_validation_run(table, suite, result, mode, start_version,
+                         rows_read, start, metrics):
+    """Monta o registro de execução da validação de uma tabela."""
+    return {
+        "table": table,
+        "suite_name": suite["suite_name"],
+        "result": result,
+        "mode": mode,
+        "start_version": start_version,
+        "rows_read": rows_read,
+        "duration_seconds": round(time.time() - start, 1),
+        "metrics": metrics,
+    }
+
+
+def append_metrics_history(spark, history_path, run_id, runs, report_page):
+    """Registra cada validação na tabela Delta de histórico de métricas.
+
+    report_page indica se a execução tem página no relatório (docs_mode
+    report), para que o index.html só crie links para páginas existentes.
+    """
+    rows = [
+        (
+            run_id["run_name"],
+            run_id["run_time"],
+            run["table"],
+            run["result"]["meta"]["expectation_suite_name"],
+            run["result"]["meta"]["batch_spec"]["delta_version"],
+            run["start_version"],
+            run["mode"],
+            run["result"]["success"],
+            run["result"]["statistics"]["evaluated_expectations"],
+            run["result"]["statistics"]["successful_expectations"],
+            run["metrics"].get("element_count"),
+            run["rows_read"],
+            run["duration_seconds"],
+            json.dumps(run["metrics"], default=str),
+            report_page,
+        )
+        for run in runs
+    ]
+    (
+        spark.createDataFrame(rows, METRICS_HISTORY_SCHEMA)
+        .withColumn("run_time", col("run_time").cast("timestamp"))
+        .write.format("delta")
+        .mode("append")
+        .option("mergeSchema", "true")
+        .save(history_path)
+    )
+
+
+def parse_validations(validations):
+    """Converte 'tabela:suite,...' na lista de pares (tabela, suite)."""
+    pairs = []
+    for item in validations.split(","):
+        table, suite_name = (part.strip() for part in item.split(":"))
+        if suite_name not in SUITES:
+            raise ValueError(f"Suite desconhecida: {suite_name}")
+        pairs.append((table, SUITES[suite_name]))
+    return pairs
+
+
+def run_validation(spark, input_path, output_path, table, suite, options,
+                   run_id):
+    """Valida um par tabela/suite em seu pool do FAIR scheduler."""
+    spark.sparkContext.setLocalProperty(
+        "spark.scheduler.pool", f"dq_{table}_{suite['suite_name']}"
+    )
+    try:
+        return validate_suite(
+            spark, input_path, output_path, table, suite, options, run_id
+        )
+    except Exception as e:
+        return {
+            "table": table,
+            "suite_name": suite["suite_name"],
+            "error": str(e),
+        }
+    finally:
+        spark.sparkContext.setLocalProperty("spark.scheduler.pool", None)
+
+
+def run_validations(spark, input_path, output_path, pairs, options, run_id):
+    """Valida os pares tabela/suite em paralelo com um pool limitado."""
+    max_workers = max(
+        1, min(options["max_parallel_validations"], len(pairs))
+    )
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(
+            lambda pair: run_validation(
+                spark, input_path, output_path, pair[0], pair[1], options,
+                run_id
+            ),
+            pairs
+        ))
+
+
+def publish_docs(spark, input_path, output_path, run_id, runs, docs_mode):
+    """Publica os resultados no relatório incremental ou nos Data Docs.
+
+    No relatório, toda execução registrada em dq_metrics_history ganha sua
+    página; se todas as tabelas vieram do cache, não há resultados novos
+    para dq_validation_results.
+    """
+    cached = all(run["mode"] == "cached" for run in runs)
+    if docs_mode == "report":
+        if not cached:
+            append_validation_results(
+                spark, f"{input_path}/dq_validation_results/", run_id, runs
+            )
+        publish_report(
+            spark, f"{output_path}/dq_report",
+            f"{input_path}/dq_metrics_history/", run_id, runs
+        )
+        print(f"Relatório gerado: {output_path}/dq_report/index.html")
+    elif cached:
+        print("Nenhuma tabela alterada; Data Docs mantidos")
+    elif docs_mode == "ge":
+        build_data_docs(output_path, runs)
+        print("Validação finalizada e Data Docs gerados")
+
+
+def process_suites(spark, input_path, output_path, pairs, options):
+    """Valida os pares tabela/suite, registra o histórico e gera o relatório.
+
+    O resultado é aprovado apenas se todas as validações passaram; erros de
+    execução (tabela inexistente, falha no Spark) interrompem o job.
+    """
+    run_id = get_run_id()
+    outcomes = run_validations(
+        spark, input_path, output_path, pairs, options, run_id
+    )
+    runs = [outcome for outcome in outcomes if "error" not in outcome]
+    errors = [outcome for outcome in outcomes if "error" in outcome]
+
+    if runs:
+        append_metrics_history(
+            spark, f"{input_path}/dq_metrics_history/", run_id, runs,
+            options["docs_mode"] == "report"
+        )
+    print_report(runs, errors)
+    success = not errors and all(run["result"]["success"] for run in runs)
+    if success:
         print("Suites de testes executadas com sucesso!")
     else:
-        print("Algumas validações falharam. Verifique os Data Docs.")
+        print("Algumas validações falharam. Verifique o relatório.")
 
-    # Gerando Data Docs
-    context.build_data_docs(site_names=["s3_site"])
-    print("Validação finalizada e Data Docs gerados")
+    if runs and options["docs_mode"] != "none":
+        publish_docs(
+            spark, input_path, output_path, run_id, runs,
+            options["docs_mode"]
+        )
+
+    if errors:
+        failed = [
+            f"{error['table']}:{error['suite_name']}" for error in errors
+        ]
+        raise RuntimeError(f"Falha ao validar: {failed}")
 
 
 def init_spark():
@@ -174,13 +746,40 @@ def init_spark():
 
 def main():
     """Função principal do job."""
-    args = getResolvedOptions(sys.argv, ['curated_bucket', 'datadocs_bucket'])
+    args = get_args()
 
     input_path = f"s3://{args['curated_bucket']}/movielens_delta_glue"
     output_path = f"s3://{args['datadocs_bucket']}"
+    options = {
+        "uniqueness_mode": args["uniqueness_mode"],
+        "approx_distinct_rsd": float(args["approx_distinct_rsd"]),
+    }
+    options["force_validation"] = args["force_validation"].lower() == "true"
+    options["validation_mode"] = args["validation_mode"]
+    options["state_path"] = f"{input_path}/dq_state"
+    options["sampling"] = None
+    if args["validation_mode"] == "sampled":
+        options["sampling"] = {
+            "fraction": (
+                float(args["sample_fraction"])
+                if args["sample_fraction"] else None
+            ),
+            "target_error": float(args["sample_target_error"]),
+            "confidence": float(args["sample_confidence"]),
+            "seed": int(args["sample_seed"]),
+        }
+    options["max_parallel_validations"] = int(
+        args["max_parallel_validations"]
+    )
+    if args["docs_mode"] not in DOCS_MODES:
+        raise ValueError(f"docs_mode inválido: {args['docs_mode']}")
+    options["docs_mode"] = args["docs_mode"]
 
     spark = init_spark()
-    process_suite_ge(spark, input_path, output_path)
+    process_suites(
+        spark, input_path, output_path,
+        parse_validations(args["validations"]), options
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,581 @@
+"""
+Motor de Data Quality compartilhado pelos jobs Glue.
+
+As expectativas de cada suite (no formato do Great Expectations) são
+compiladas em uma única agregação Spark por tabela: contagens de nulos,
+mínimos/máximos, violações de intervalo e unicidade (distinct exato ou
+aproximado) saem de uma só leitura, e a lista de colunas é verificada pelo
+schema. O resultado segue o JSON de validação do Great Expectations.
+
+Usado pelo job de Data Quality e pela auditoria (write-audit-publish) do
+job staged → curated; distribuído aos jobs via --extra-py-files.
+"""
+import hashlib
+import json
+from datetime import datetime, timezone
+
+from delta.tables import DeltaTable
+from pyspark.sql.functions import (
+    approx_count_distinct, col, count, count_distinct, lit, when,
+)
+from pyspark.sql.functions import max as spark_max
+from pyspark.sql.functions import min as spark_min
+
+GE_VERSION = '0.16.5'
+SUITE_NAME_MOVIES = 'suite_tests_movie_ratings'
+SUITE_NAME_TAGS = 'suite_tests_user_tags'
+
+SUITES = {
+    SUITE_NAME_MOVIES: {
+        'suite_name': SUITE_NAME_MOVIES,
+        'expectations': [
+            {
+                "expectation_type": (
+                    "expect_table_columns_to_match_ordered_list"
+                ),
+                "kwargs": {"column_list": [
+                    "movieid", "title", "genres", "genre_mask", "avg_rating",
+                    "rating_count", "rating_stddev", "bayesian_avg_rating",
+                    "distinct_users", "median_rating", "p90_rating"
+                ]},
+            },
+            {
+                "expectation_type": "expect_column_values_to_be_unique",
+                "kwargs": {"column": "movieid"},
+            },
+            {
+                "expectation_type": "expect_column_values_to_not_be_null",
+                "kwargs": {"column": "movieid"},
+                "meta": {"exact": True},
+            },
+            {
+                "expectation_type": "expect_column_values_to_be_between",
+                "kwargs": {
+                    "column": "avg_rating", "min_value": 0, "max_value": 5
+                },
+            },
+        ],
+    },
+    SUITE_NAME_TAGS: {
+        'suite_name': SUITE_NAME_TAGS,
+        'expectations': [
+            {
+                "expectation_type": (
+                    "expect_table_columns_to_match_ordered_list"
+                ),
+                "kwargs": {"column_list": ["userid", "tag", "tag_count"]},
+            },
+            {
+                "expectation_type": "expect_column_values_to_not_be_null",
+                "kwargs": {"column": "userid"},
+                "meta": {"exact": True},
+            },
+            {
+                "expectation_type": "expect_column_values_to_be_between",
+                "kwargs": {
+                    "column": "tag_count", "min_value": 0, "max_value": 1000
+                },
+            },
+        ],
+    },
+}
+
+# Opções que alteram o resultado da validação (entram no hash da suite)
+RESULT_OPTIONS = ['uniqueness_mode', 'approx_distinct_rsd', 'sampling']
+
+# Opções padrão do motor (as mesmas do job de Data Quality)
+DEFAULT_OPTIONS = {
+    'uniqueness_mode': 'exact',
+    'approx_distinct_rsd': 0.01,
+    'sampling': None,
+}
+
+
+###############################################################################
+# Compilação das expectativas em métricas
+###############################################################################
+def metric_alias(metric, column, *params):
+    """Nome da métrica na agregação (compartilhada entre expectativas)."""
+    return ":".join([metric, column] + [str(param) for param in params])
+
+
+def percent(part, total):
+    """Percentual de part sobre total (None quando total é zero)."""
+    return part / total * 100 if total else None
+
+
+def column_map_result(element_count, missing_count, unexpected_count, mostly):
+    """Monta o resultado de uma expectativa por valor, como no GE."""
+    nonmissing_count = element_count - missing_count
+    unexpected_percent = percent(unexpected_count, nonmissing_count)
+    success = (
+        nonmissing_count == 0
+        or (nonmissing_count - unexpected_count) / nonmissing_count >= mostly
+    )
+    return success, {
+        "element_count": element_count,
+        "missing_count": missing_count,
+        "missing_percent": percent(missing_count, element_count),
+        "unexpected_count": unexpected_count,
+        "unexpected_percent": unexpected_percent,
+        "unexpected_percent_total": percent(unexpected_count, element_count),
+        "unexpected_percent_nonmissing": unexpected_percent,
+        "partial_unexpected_list": [],
+    }
+
+
+def is_between(value, kwargs):
+    """Verifica value contra min_value/max_value (e strict_min/strict_max)."""
+    min_value, max_value = kwargs.get("min_value"), kwargs.get("max_value")
+    if value is None:
+        return False
+    if min_value is not None:
+        if value < min_value or (
+            kwargs.get("strict_min") and value == min_value
+        ):
+            return False
+    if max_value is not None:
+        if value > max_value or (
+            kwargs.get("strict_max") and value == max_value
+        ):
+            return False
+    return True
+
+
+def get_out_of_range_condition(column, kwargs):
+    """Condição Spark para valores não nulos fora do intervalo."""
+    c = col(column)
+    conditions = []
+    if kwargs.get("min_value") is not None:
+        min_value = lit(kwargs["min_value"])
+        conditions.append(
+            c <= min_value if kwargs.get("strict_min") else c < min_value
+        )
+    if kwargs.get("max_value") is not None:
+        max_value = lit(kwargs["max_value"])
+        conditions.append(
+            c >= max_value if kwargs.get("strict_max") else c > max_value
+        )
+    if not conditions:
+        return lit(False)
+    condition = conditions[0]
+    for other in conditions[1:]:
+        condition = condition | other
+    return c.isNotNull() & condition
+
+
+def compiled_expectation(evaluate, counts=None, aggregates=None, keys=None):
+    """Agrupa as métricas e a avaliação de uma expectativa compilada.
+
+    counts: condições por linha (métricas aditivas, mantidas por deltas);
+    aggregates: agregações não aditivas (exigem leitura completa), exceto
+    as listadas em keys (alias → coluna), mantidas pelo estado de chaves.
+    """
+    return {
+        "evaluate": evaluate,
+        "counts": counts or {},
+        "aggregates": aggregates or {},
+        "keys": keys or {},
+    }
+
+
+def compile_not_null(kwargs, options):
+    """expect_column_values_to_not_be_null."""
+    column = kwargs["column"]
+    nulls = metric_alias("null_count", column)
+
+    def evaluate(row, columns):
+        return column_map_result(
+            row["element_count"], 0, row[nulls], kwargs.get("mostly", 1)
+        )
+
+    return compiled_expectation(
+        evaluate, counts={nulls: col(column).isNull()}
+    )
+
+
+def compile_between(kwargs, options):
+    """expect_column_values_to_be_between."""
+    column = kwargs["column"]
+    nulls = metric_alias("null_count", column)
+    out_of_range = metric_alias(
+        "out_of_range_count", column, kwargs.get("min_value"),
+        kwargs.get("max_value"), kwargs.get("strict_min", False),
+        kwargs.get("strict_max", False)
+    )
+
+    def evaluate(row, columns):
+        return column_map_result(
+            row["element_count"], row[nulls], row[out_of_range],
+            kwargs.get("mostly", 1)
+        )
+
+    return compiled_expectation(evaluate, counts={
+        nulls: col(column).isNull(),
+        out_of_range: get_out_of_range_condition(column, kwargs),
+    })
+
+
+def compile_unique(kwargs, options):
+    """expect_column_values_to_be_unique (não nulos − distintos)."""
+    column = kwargs["column"]
+    nulls = metric_alias("null_count", column)
+    duplicates = metric_alias(
+        "duplicate_count", column, options["uniqueness_mode"]
+    )
+
+    if options["uniqueness_mode"] == "approx":
+        distinct_expr = approx_count_distinct(
+            col(column), options["approx_distinct_rsd"]
+        )
+    else:
+        distinct_expr = count_distinct(col(column))
+
+    def evaluate(row, columns):
+        return column_map_result(
+            row["element_count"], row[nulls], max(row[duplicates], 0),
+            kwargs.get("mostly", 1)
+        )
+
+    return compiled_expectation(
+        evaluate,
+        counts={nulls: col(column).isNull()},
+        aggregates={duplicates: count(col(column)) - distinct_expr},
+        keys={duplicates: column},
+    )
+
+
+def compile_column_aggregate(metric, aggregate):
+    """Cria o compilador de expect_column_{min,max}_to_be_between."""
+    def compile_expectation(kwargs, options):
+        column = kwargs["column"]
+        alias = metric_alias(metric, column)
+
+        def evaluate(row, columns):
+            observed = row[alias]
+            return is_between(observed, kwargs), {"observed_value": observed}
+
+        return compiled_expectation(
+            evaluate, aggregates={alias: aggregate(col(column))}
+        )
+
+    return compile_expectation
+
+
+def compile_row_count(kwargs, options):
+    """expect_table_row_count_to_be_between."""
+    def evaluate(row, columns):
+        observed = row["element_count"]
+        return is_between(observed, kwargs), {"observed_value": observed}
+
+    return compiled_expectation(evaluate)
+
+
+def compile_columns_ordered_list(kwargs, options):
+    """expect_table_columns_to_match_ordered_list (apenas schema)."""
+    def evaluate(row, columns):
+        return list(columns) == list(kwargs["column_list"]), {
+            "observed_value": list(columns)
+        }
+
+    return compiled_expectation(evaluate)
+
+
+EXPECTATION_COMPILERS = {
+    'expect_column_values_to_not_be_null': compile_not_null,
+    'expect_column_values_to_be_between': compile_between,
+    'expect_column_values_to_be_unique': compile_unique,
+    'expect_column_min_to_be_between': (
+        compile_column_aggregate("min", spark_min)
+    ),
+    'expect_column_max_to_be_between': (
+        compile_column_aggregate("max", spark_max)
+    ),
+    'expect_table_row_count_to_be_between': compile_row_count,
+    'expect_table_columns_to_match_ordered_list': compile_columns_ordered_list,
+}
+
+
+def compile_suite(suite, columns, options):
+    """Compila as expectativas da suite (None para colunas inexistentes)."""
+    compiled = []
+    for expectation in suite["expectations"]:
+        column = expectation["kwargs"].get("column")
+        if column is not None and column not in columns:
+            compiled.append((expectation, None))
+            continue
+        compile_expectation = EXPECTATION_COMPILERS[
+            expectation["expectation_type"]
+        ]
+        compiled.append(
+            (expectation, compile_expectation(expectation["kwargs"], options))
+        )
+    return compiled
+
+
+def collect_metrics(compiled, field):
+    """Une as métricas de um tipo (counts/aggregates/keys) da suite."""
+    metrics = {}
+    for _, expectation in compiled:
+        if expectation is not None:
+            metrics.update(expectation[field])
+    return metrics
+
+
+###############################################################################
+# Validação (uma leitura por tabela)
+###############################################################################
+def build_expectation_result(expectation, success, result, error=None):
+    """Monta o ExpectationValidationResult (formato GE) de uma expectativa."""
+    return {
+        "success": bool(success),
+        "expectation_config": {
+            "expectation_type": expectation["expectation_type"],
+            "kwargs": expectation["kwargs"],
+            "meta": expectation.get("meta", {}),
+        },
+        "result": result,
+        "meta": {},
+        "exception_info": {
+            "raised_exception": error is not None,
+            "exception_message": error,
+            "exception_traceback": None,
+        },
+    }
+
+
+def compute_full_metrics(df, compiled):
+    """Calcula todas as métricas da suite com uma única agregação Spark."""
+    counts = {"element_count": lit(True)}
+    counts.update(collect_metrics(compiled, "counts"))
+    aggregates = collect_metrics(compiled, "aggregates")
+    return df.agg(
+        *[
+            count(when(condition, 1)).alias(alias)
+            for alias, condition in counts.items()
+        ],
+        *[metric.alias(alias) for alias, metric in aggregates.items()],
+    ).first().asDict()
+
+
+def build_validation_result(table, table_path, version, suite, compiled,
+                            metrics, columns, run_id, sampling=None):
+    """Avalia as expectativas sobre as métricas e monta o resultado GE."""
+    results = []
+    for expectation, compiled_expectation in compiled:
+        if compiled_expectation is None:
+            column = expectation["kwargs"]["column"]
+            results.append(build_expectation_result(
+                expectation, False, {}, f"Coluna não encontrada: {column}"
+            ))
+            continue
+        success, result = compiled_expectation["evaluate"](metrics, columns)
+        if sampling is not None:
+            result = add_sampling_details(
+                result, compiled_expectation, sampling
+            )
+        results.append(build_expectation_result(expectation, success, result))
+
+    successful = sum(1 for result in results if result["success"])
+    return {
+        "success": successful == len(results),
+        "results": results,
+        "evaluation_parameters": {},
+        "statistics": {
+            "evaluated_expectations": len(results),
+            "successful_expectations": successful,
+            "unsuccessful_expectations": len(results) - successful,
+            "success_percent": percent(successful, len(results)),
+        },
+        "meta": {
+            "great_expectations_version": GE_VERSION,
+            "expectation_suite_name": suite["suite_name"],
+            "run_id": run_id,
+            "batch_spec": {
+                "path": table_path,
+                "data_asset_name": table,
+                "delta_version": version,
+            },
+            "batch_markers": {},
+            "active_batch_definition": {
+                "datasource_name": "native_spark",
+                "data_connector_name": "delta",
+                "data_asset_name": table,
+                "batch_identifiers": {"delta_version": version},
+            },
+            "validation_time": run_id["run_time"],
+            "checkpoint_name": None,
+        },
+    }
+
+
+def validate_dataframe(df, table, table_path, version, suite, options,
+                       run_id):
+    """Valida um DataFrame contra a suite com uma única agregação.
+
+    Retorna o resultado (formato GE) e as métricas calculadas.
+    """
+    compiled = compile_suite(suite, df.columns, options)
+    metrics = compute_full_metrics(df, compiled)
+    result = build_validation_result(
+        table, table_path, version, suite, compiled, metrics, df.columns,
+        run_id
+    )
+    return result, metrics
+
+
+def add_sampling_details(result, compiled_expectation, sampling):
+    """Anexa ao resultado os intervalos de confiança das métricas amostradas.
+
+    Os limites são percentuais sobre o total de linhas da tabela.
+    """
+    bounds = {
+        alias: sampling["bounds"][alias]
+        for alias in compiled_expectation["counts"]
+        if alias in sampling["bounds"]
+    }
+    if not bounds:
+        return result
+    return dict(result, details={"sampling": {
+        "sample_fraction": sampling["sample_fraction"],
+        "sample_size": sampling["sample_size"],
+        "confidence": sampling["confidence"],
+        "rate_bounds_percent": bounds,
+    }})
+
+
+def get_run_id():
+    """Gera o run_id (run_name, run_time) no formato do GE."""
+    run_time = datetime.now(timezone.utc)
+    return {
+        "run_name": run_time.strftime("%Y%m%dT%H%M%S.%fZ"),
+        "run_time": run_time.isoformat(),
+    }
+
+
+###############################################################################
+# Change Data Feed (validação incremental e atualização das tabelas curated)
+###############################################################################
+def get_change_sign():
+    """Retorna +1 para inserts/pós-imagens e -1 para deletes/pré-imagens."""
+    return (
+        when(col("_change_type").isin("insert", "update_postimage"), 1)
+        .when(col("_change_type").isin("delete", "update_preimage"), -1)
+        .otherwise(0)
+    )
+
+
+def is_missing_file_error(error):
+    """Indica se um Py4JJavaError foi causado por arquivo inexistente.
+
+    Percorre as causas da exceção Java procurando FileNotFoundException
+    (ex.: arquivos de dados ou de _change_data removidos pelo VACUUM).
+    """
+    cause = error.java_exception
+    while cause is not None:
+        java_class = cause.getClass()
+        while java_class is not None:
+            if java_class.getName() == "java.io.FileNotFoundException":
+                return True
+            java_class = java_class.getSuperclass()
+        cause = cause.getCause()
+    return False
+
+
+###############################################################################
+# Persistência dos resultados
+###############################################################################
+def write_text(spark, path, content):
+    """Grava um arquivo texto via Hadoop FileSystem (S3 ou local)."""
+    hadoop_path = spark._jvm.org.apache.hadoop.fs.Path(path)
+    fs = hadoop_path.getFileSystem(spark._jsc.hadoopConfiguration())
+    stream = fs.create(hadoop_path, True)
+    try:
+        stream.write(bytearray(content.encode("utf-8")))
+    finally:
+        stream.close()
+
+
+def read_text(spark, path):
+    """Lê um arquivo texto via Hadoop FileSystem (None se não existir)."""
+    hadoop_path = spark._jvm.org.apache.hadoop.fs.Path(path)
+    fs = hadoop_path.getFileSystem(spark._jsc.hadoopConfiguration())
+    if not fs.exists(hadoop_path):
+        return None
+    stream = fs.open(hadoop_path)
+    try:
+        reader = spark._jvm.java.io.BufferedReader(
+            spark._jvm.java.io.InputStreamReader(stream, "UTF-8")
+        )
+        return "\n".join(iter(reader.readLine, None))
+    finally:
+        stream.close()
+
+
+def get_table_version(spark, table_path):
+    """Retorna a versão atual de uma tabela Delta."""
+    return (
+        DeltaTable.forPath(spark, table_path)
+        .history(1).select("version").first()["version"]
+    )
+
+
+def get_suite_hash(suite, options):
+    """Hash das expectativas da suite e das opções que afetam o resultado."""
+    payload = json.dumps(
+        {
+            "expectations": suite["expectations"],
+            "options": {name: options[name] for name in RESULT_OPTIONS},
+        },
+        sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get_cache_path(output_path, table, suite):
+    """Caminho do resultado em cache do par tabela/suite."""
+    return f"{output_path}/dq_cache/{table}/{suite['suite_name']}.json"
+
+
+def load_cache_entry(spark, output_path, table, suite):
+    """Retorna a última validação em cache do par tabela/suite (ou None)."""
+    content = read_text(spark, get_cache_path(output_path, table, suite))
+    return json.loads(content) if content is not None else None
+
+
+def save_cache_entry(spark, output_path, table, suite, entry):
+    """Grava a validação (chave, resultado e métricas) no cache."""
+    write_text(
+        spark, get_cache_path(output_path, table, suite),
+        json.dumps(entry, default=str)
+    )
+
+
+def get_validation_path(output_path, result, table):
+    """Caminho do JSON no layout do validations store do GE."""
+    meta = result["meta"]
+    return (
+        f"{output_path}/validations/{meta['expectation_suite_name']}/"
+        f"{meta['run_id']['run_name']}/{meta['run_id']['run_name']}/"
+        f"{table}.json"
+    )
+
+
+def save_validation_result(spark, output_path, table, result):
+    """Grava o resultado de validação (JSON compatível com o GE)."""
+    write_text(
+        spark, get_validation_path(output_path, result, table),
+        json.dumps(result, indent=2, default=str)
+    )
+
+
+def print_failed_expectations(result):
+    """Imprime as expectativas que falharam em um resultado de validação."""
+    for expectation in result["results"]:
+        config = expectation["expectation_config"]
+        if not expectation["success"]:
+            print(
+                f"  └─ {config['expectation_type']} "
+                f"{config['kwargs'].get('column', '')}: "
+                f"{json.dumps(expectation['result'], default=str)}"
+            )